@@ -0,0 +1,189 @@
+# batch.py
+
+"""
+Headless batch mode for the EAD XML Processing project.
+
+This module processes every EAD in a directory (or matching a glob) without prompting: each finding aid is
+extracted, numbered with a preset preference and finalized in a pool of worker processes, and its folder and box
+Excel files are written for mail merge. Labels can optionally be merged afterwards with a preset label type. A
+summary of timings, folder counts and box counts per collection is printed and saved as a CSV file.
+
+Usage: python batch.py [DIRECTORY_OR_GLOB ...] [--numbering continuous|non-continuous] [--workers N]
+                       [--shard-workers N] [--output DIRECTORY] [--labels 1-8] [--summary FILE]
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import logging
+import multiprocessing
+import os
+import time
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from main import (NAMESPACES, get_working_directory, initialize_folder_dataframe, initialize_box_dataframe, process_collection,
+                  finalize_dataframes, generate_excel_files)
+from xml_processing import EADDocument, describe_xml_file, is_sanitized_artifact
+from folder_cache import load_cached_rows, store_cached_rows
+from mail_merge import label_selection_menu
+from sharded_extraction import default_extraction_workers
+
+NUMBERING_PREFERENCES = {"continuous": "1", "non-continuous": "2"}  # same choices as prompt_folder_numbering_preference
+SUMMARY_FILENAME = "batch_summary.csv"
+
+def find_ead_candidates(paths):
+    """XML files named by paths (directories, globs or files), sanitized copies excluded, without duplicates."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            matches = glob.glob(os.path.join(path, '*.xml'))
+        else:
+            matches = glob.glob(path)
+        for file_path in sorted(matches):
+            file_path = os.path.abspath(file_path)
+            if not is_sanitized_artifact(file_path) and file_path not in files:
+                files.append(file_path)
+    return files
+
+def source_name(file_path):
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+def process_ead_file(file_path, numbering_preference, output_directory=None, extraction_workers=1):
+    """Worker: extracts, numbers and finalizes one EAD and writes its Excel files, with no prompts.
+    extraction_workers > 1 extracts a large EAD series by series in that many processes (see sharded_extraction).
+    Files the run writes besides the Excel files (folder row cache, sanitized copy, series index) go to output_directory
+    too when one is given, so input directories are left as they are. Returns a summary dict (status, counts, timings
+    and the Excel paths)."""
+    started = time.perf_counter()
+    working_directory = output_directory or os.path.dirname(file_path)
+    summary = {"file": os.path.basename(file_path), "collection": None, "call_number": None, "status": "ok",
+               "folders": 0, "boxes": 0, "flagged_boxes": False, "numbering": None,
+               "scan_seconds": 0.0, "extract_seconds": 0.0, "finalize_seconds": 0.0, "write_seconds": 0.0, "total_seconds": 0.0,
+               "folder_excel": None, "box_excel": None}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # workers share one console: only the summary is printed
+            entry, document = describe_xml_file(file_path, NAMESPACES, output_directory)
+            summary["scan_seconds"] = time.perf_counter() - started
+            if not entry["is_ead"]:
+                summary["status"] = "skipped: not an EAD"
+                return summary
+            collection_name, call_number, repository_name = entry["name"], entry["number"], entry["repository"]
+            summary["collection"], summary["call_number"] = collection_name, call_number
+
+            step_started = time.perf_counter()
+            folder_df = load_cached_rows(working_directory, entry["content_hash"])
+            if folder_df is None:
+                collection_info = {"path": file_path, "document": document or EADDocument(file_path, output_directory)}
+                folder_df, _ = process_collection(collection_info, collection_name, call_number, repository_name,
+                                                  initialize_folder_dataframe(), initialize_box_dataframe(), NAMESPACES,
+                                                  workers=extraction_workers, catalog_directory=output_directory)
+                store_cached_rows(working_directory, entry["content_hash"], folder_df)
+            summary["extract_seconds"] = time.perf_counter() - step_started
+            if folder_df.empty:
+                summary["status"] = "skipped: no folders"
+                return summary
+
+            step_started = time.perf_counter()
+            folders_already_numbered = folder_df['FOLDER'].notna().sum() > folder_df['FOLDER'].isna().sum()
+            folder_numbering_preference = None if folders_already_numbered else numbering_preference
+            folder_df, box_df = finalize_dataframes(folder_df, initialize_box_dataframe(), collection_name, call_number, repository_name,
+                                                    folder_numbering_preference, folders_already_numbered, NAMESPACES)
+            summary["finalize_seconds"] = time.perf_counter() - step_started
+
+            step_started = time.perf_counter()
+            # EADs that share a title and call number would otherwise overwrite each other's files
+            summary["folder_excel"], summary["box_excel"] = generate_excel_files(folder_df, box_df, collection_name, call_number,
+                                                                               working_directory, source_name=source_name(file_path))
+            summary["write_seconds"] = time.perf_counter() - step_started
+
+            summary["folders"], summary["boxes"] = len(folder_df), len(box_df)
+            summary["flagged_boxes"] = "10001" in box_df['BOX'].values
+            summary["numbering"] = "already numbered" if folders_already_numbered else ("continuous" if folder_numbering_preference == "1" else "non-continuous")
+    except Exception as e:
+        logging.error(f"Batch processing of {file_path} failed: {str(e)}")
+        summary["status"] = f"error: {str(e)}"
+    finally:
+        summary["total_seconds"] = time.perf_counter() - started
+    return summary
+
+def print_summary_line(summary):
+    if summary["status"] == "ok":
+        print(f"{summary['collection']} : {summary['call_number']} ({summary['file']}) - {summary['folders']} folder{'s' if summary['folders'] != 1 else ''} "
+              f"in {summary['boxes']} box{'es' if summary['boxes'] != 1 else ''}, {summary['total_seconds']:.1f}s"
+              + (" - check box '10001' flags" if summary["flagged_boxes"] else ""))
+    else:
+        print(f"{summary['file']} - {summary['status']}")
+
+def run_batch(paths, numbering_preference="1", workers=None, output_directory=None, label_type=None, summary_path=None, extraction_workers=1):
+    """Processes every EAD in paths across worker processes; returns the list of per-file summaries, in file order."""
+    batch_started = time.perf_counter()
+    files = find_ead_candidates(paths)
+    if not files:
+        print("No XML files found to process.")
+        return []
+    workers = workers or min(len(files), os.cpu_count() or 1)
+    if output_directory:
+        os.makedirs(output_directory, exist_ok=True)
+    print(f"Processing {len(files)} XML file{'s' if len(files) != 1 else ''} with {workers} worker process{'es' if workers != 1 else ''}...\n")
+
+    summaries = {}
+    if workers == 1:
+        for file_path in files:
+            summaries[file_path] = process_ead_file(file_path, numbering_preference, output_directory, extraction_workers)
+            print_summary_line(summaries[file_path])
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(process_ead_file, file_path, numbering_preference, output_directory, extraction_workers): file_path for file_path in files}
+            for future in as_completed(futures):
+                summaries[futures[future]] = future.result()
+                print_summary_line(summaries[futures[future]])
+    summaries = [summaries[file_path] for file_path in files]
+
+    # Word is driven from this process only, one collection after the other
+    if label_type is not None:
+        import win32com.client  # only needed for labels, so batch runs that just write Excel files work without pywin32
+        wordApp = win32com.client.Dispatch('Word.Application')
+        for summary in summaries:
+            if summary["status"] == "ok":
+                folder_numbering_preference = NUMBERING_PREFERENCES.get(summary["numbering"])
+                # intermediate files of the merge are named after the collection, so the source file name keeps them apart too
+                label_selection_menu(wordApp, summary["folder_excel"], summary["box_excel"], output_directory or os.path.dirname(summary["folder_excel"]),
+                                     folder_numbering_preference, summary["numbering"] == "already numbered",
+                                     f"{summary['collection']}_{source_name(summary['file'])}", preset_label_type=label_type)
+
+    processed = [summary for summary in summaries if summary["status"] == "ok"]
+    print(f"\nDone in {time.perf_counter() - batch_started:.1f}s: {len(processed)} collection{'s' if len(processed) != 1 else ''}, "
+          f"{sum(summary['folders'] for summary in processed)} folders, {sum(summary['boxes'] for summary in processed)} boxes"
+          f"{f', {len(summaries) - len(processed)} file(s) skipped or failed' if len(processed) != len(summaries) else ''}")
+
+    summary_path = summary_path or os.path.join(output_directory or get_working_directory(), SUMMARY_FILENAME)
+    pd.DataFrame(summaries).to_csv(summary_path, index=False)
+    print(f"Summary saved to {summary_path}")
+    logging.info(f"Batch processed {len(summaries)} file(s), summary saved to {summary_path}")
+    return summaries
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Process every EAD in a directory or glob without prompts, in parallel.")
+    parser.add_argument("paths", nargs="*", help="directories, glob patterns or XML files (default: the program's directory)")
+    parser.add_argument("--numbering", choices=sorted(NUMBERING_PREFERENCES), default="continuous",
+                        help="how to number folders that the finding aid does not number (default: continuous)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU core)")
+    parser.add_argument("--shard-workers", type=int, default=None,
+                        help="processes for extracting each EAD over 5 MB series by series, best with --workers 1 "
+                             "(default: LABELGENE_EXTRACTION_WORKERS, or 1 for no sharding)")
+    parser.add_argument("--output", default=None, help="directory for the Excel files, labels and summary (default: next to each EAD)")
+    parser.add_argument("--labels", choices=[str(option) for option in range(1, 9)], default=None,
+                        help="also merge labels with this option of the label menu (needs Microsoft Word)")
+    parser.add_argument("--summary", default=None, help=f"where to save the summary CSV (default: {SUMMARY_FILENAME})")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    run_batch(arguments.paths or [get_working_directory()], NUMBERING_PREFERENCES[arguments.numbering], arguments.workers,
+              arguments.output, arguments.labels, arguments.summary, arguments.shard_workers or default_extraction_workers())
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
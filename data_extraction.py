@@ -9,36 +9,109 @@ metadata from the parsed XML files.
 """
 
 import re
+from collections import namedtuple
 from lxml import etree as ET
 
-def extract_box_number(did_element, namespaces):
-    """Extracts the box number from the given element."""
-    all_box_components = did_element.findall(".//ns:container", namespaces=namespaces)
-    for box_component in all_box_components:
-        if box_component.attrib.get('type', '').lower() == 'box':
-            return box_component.text # Beinecke EADs almost always have terminal c components which if has only one container element, that element is of @type 'box'
-    # but what if only one container element but @type 'folder'? 
-    # if not @type box get whatever is in text node if not @type folder
-    # helps catch container elem with direct text like 123 (Art) (e.g. Henri Chopin ead(encoding problem fixed))
-    for box_component in all_box_components:
-        if box_component.attrib.get('type', '').lower() != 'folder': 
-            return box_component.text
-    return "10001"  # arbitrary num string flag for unusual/unavailable box number info/num cos mathematically useful than using "Box unavailable"
-
-def extract_folder_date(did_element, namespaces):
-    """Extracts the folder date from the given element."""
-    unitdate_element = did_element.find(".//ns:unitdate", namespaces=namespaces)
-    return unitdate_element.text if unitdate_element is not None else "Date unavailable" # arbitrary to ensure return type str 
-
-def extract_base_folder_title(did_element, namespaces):
-    """Extracts base FOLDER_TITLE from the given element."""
-    unittitle_element = did_element.find(".//ns:unittitle", namespaces=namespaces)
-    return " ".join(unittitle_element.itertext()) if unittitle_element is not None else "Title unavailable" # arbitrary to ensure return type str 
-
-def extract_ancestor_data(node, namespaces):
-    """extracts ancestor data from each terminal <c>/<cxx> node"""
+# Element kinds shared by all traversal code, so hot loops do one dict lookup per element instead of QName + regex
+C_COMPONENT = "c"  # <c> or <c01>..<c12> (any <cNN>)
+DSC = "dsc"
+DID = "did"
+CONTAINER = "container"
+OTHER = "other"
+
+TAG_KINDS = {}  # fully qualified tag string -> kind, filled in the first time each tag is seen
+
+def tag_kind(tag):
+    """Classifies an element tag as C_COMPONENT, DSC, DID, CONTAINER or OTHER (comments and PIs are OTHER)."""
+    kind = TAG_KINDS.get(tag)
+    if kind is None:
+        if not isinstance(tag, str):
+            return OTHER
+        localname = ET.QName(tag).localname
+        if re.match(r'c\d{0,2}$|^c$', localname): # Match both unnumbered/numbered c tags
+            kind = C_COMPONENT
+        elif localname in (DSC, DID, CONTAINER):
+            kind = localname
+        else:
+            kind = OTHER
+        TAG_KINDS[tag] = kind
+    return kind
+
+COMPONENT_TAGS = {}  # namespace uri -> fully qualified <c>, <c0>..<c9> and <c00>..<c99> tags (tag_kind's C_COMPONENT)
+
+def component_tags(namespaces):
+    """The C_COMPONENT tags in the EAD namespace, as a tag filter for iter(); much faster than '{*}' wildcards."""
+    tags = COMPONENT_TAGS.get(namespaces['ns'])
+    if tags is None:
+        names = ['c'] + [f'c{number}' for number in range(10)] + [f'c{number:02d}' for number in range(100)]
+        tags = COMPONENT_TAGS[namespaces['ns']] = tuple(ET.QName(namespaces['ns'], name).text for name in names)
+    return tags
+
+# Everything the folder row builders need from a terminal <did>, read in one pass by extract_did_fields
+DidFields = namedtuple('DidFields', ['box', 'folder_text', 'container_type', 'container_types', 'title', 'date', 'extents'])
+
+DID_FIELD_TAGS = {}  # namespace uri -> fully qualified (container, unittitle, unitdate, extent, physdesc) tags
+
+def extract_did_fields(did_element, namespaces, text_fields=True):
+    """Reads box, folder text, container type, title, date and extents from a terminal <did> in a single filtered walk.
+    The box is the first <container> of @type 'box', else the first one not of @type 'folder' (e.g. direct text like
+    "123 (Art)"), else the "10001" flag; title and date come from the first <unittitle>/<unitdate>, nested ones included.
+    container_types lists the lowercased @type of each direct <container>, for picking the numbering case.
+    With text_fields=False only containers and extents are read (enough to number and count folders), title and date are None."""
+    tags = DID_FIELD_TAGS.get(namespaces['ns'])
+    if tags is None:
+        tags = DID_FIELD_TAGS[namespaces['ns']] = tuple(ET.QName(namespaces['ns'], name).text for name in ('container', 'unittitle', 'unitdate', 'extent', 'physdesc'))
+    container_tag, unittitle_tag, unitdate_tag, extent_tag, physdesc_tag = tags
+
+    box = other_box = folder_text = container_type = title = date = None
+    container_types = []
+    extents = []
+    # iter() with tag filters walks all descendants in document order, so nested elements keep their .// precedence
+    wanted_tags = (container_tag, unittitle_tag, unitdate_tag, extent_tag) if text_fields else (container_tag, extent_tag)
+    for elem in did_element.iter(*wanted_tags):
+        tag = elem.tag
+        if tag == container_tag:
+            container_kind = elem.attrib.get('type', '').lower()
+            if box is None and container_kind == 'box':
+                box = elem
+            elif other_box is None and container_kind != 'folder':
+                other_box = elem
+            if elem.getparent() is did_element:
+                if not container_types:
+                    container_type = elem.attrib.get('altrender', None)
+                if folder_text is None and container_kind == 'folder':
+                    folder_text = elem
+                container_types.append(container_kind)
+        elif tag == unittitle_tag:
+            if title is None:
+                title = " ".join(elem.itertext())
+        elif tag == unitdate_tag:
+            if date is None:
+                date = (elem.text,)  # wrapped so a text-less first <unitdate> still counts as found
+        else:
+            physdesc = elem.getparent()
+            if physdesc.tag == physdesc_tag and physdesc.getparent() is did_element:
+                extents.append(elem.text)
+
+    if box is not None:
+        box_number = box.text
+    elif other_box is not None:
+        box_number = other_box.text
+    else:
+        box_number = "10001"  # arbitrary num string flag for unusual/unavailable box number info, more useful in box ranges than "Box unavailable"
+
+    return DidFields(box=box_number,
+                     folder_text=folder_text.text if folder_text is not None else None,
+                     container_type=container_type,
+                     container_types=container_types,
+                     title=title if title is not None else ("Title unavailable" if text_fields else None),
+                     date=date[0] if date is not None else ("Date unavailable" if text_fields else None),
+                     extents=extents)
+
+def extract_ancestor_data(node, namespaces, label_cache=None):
+    """extracts ancestor data from each terminal <c>/<cxx> node
+    label_cache (a dict, one per document) memoizes each ancestor's formatted label so that sibling leaves share it"""
     ancestors_data = []
-    ancestor_count = 0 # for limits to column number count for c ancestors
 
     # Exclude descendant from returned list: ancestors only
     #ancestors = node.iterancestors()
@@ -48,40 +121,54 @@ def extract_ancestor_data(node, namespaces):
     ancestors.pop()
 
     for ancestor in ancestors:
-        ancestor_tag = ET.QName(ancestor.tag).localname
-
         # Match both unnumbered/numbered c tags
-        if re.match(r'c\d{0,2}$|^c$', ancestor_tag): 
-            is_first_gen_c = ET.QName(ancestor.getparent().tag).localname == 'dsc' # because all 1st gen 'c'/cxx' are direct children of <dsc>
-            #is_series = ancestor.attrib.get('level') == 'series' # because not all first_gen_c's are an archival 'series'
-
-            did_element = ancestor.find("./ns:did", namespaces=namespaces)
-            if did_element is not None:
-                unittitle_element = did_element.find("./ns:unittitle", namespaces=namespaces)
-                unittitle = " ".join(unittitle_element.itertext()).strip() if unittitle_element is not None else "X" # arbitrary to ensure return type str 
-
-                unitid_element = did_element.find("./ns:unitid", namespaces=namespaces)
-                if is_first_gen_c and unitid_element is not None:  # if unitid in first_gen_c, it MUST be @level="series"
-                    unitid_text = unitid_element.text
-                    try:
-                        unitid = int(unitid_text)
-                        if unitid <= 40:  # Convert to Roman only if unitid is an integer and the integer is up to 40
-                            roman_numeral = convert_to_roman(unitid)
-                            ancestors_data.append(f"Series {roman_numeral}. {unittitle}") 
-                        else:
-                            ancestors_data.append(unittitle) 
-                    except ValueError:  # For non-integer unitids
-                        ancestors_data.append(f"Series {unitid_text}. {unittitle}")  
-                else:
-                        ancestors_data.append(unittitle)
-                    
-                ancestor_count += 1
-
-                if ancestor_count >= 5: # '5' for the 5 <cxx> ancestor columns in folder_df
+        if tag_kind(ancestor.tag) == C_COMPONENT:
+            label = cached_ancestor_label(ancestor, namespaces, label_cache)
+            if label is not None:
+                ancestors_data.append(label)
+
+                if len(ancestors_data) >= 5: # '5' for the 5 <cxx> ancestor columns in folder_df
                     break
                 
     return ancestors_data
 
+def cached_ancestor_label(ancestor, namespaces, label_cache):
+    """format_ancestor_label, looked up in / stored to label_cache (keyed by ancestor element) when one is given"""
+    if label_cache is None:
+        return format_ancestor_label(ancestor, namespaces)
+    try:
+        return label_cache[ancestor]
+    except KeyError:
+        label = label_cache[ancestor] = format_ancestor_label(ancestor, namespaces)
+        return label
+
+def format_ancestor_label(ancestor, namespaces):
+    """Formats the C0N_ANCESTOR label of one <c>/<cxx> ancestor, or None if it has no <did>"""
+    is_first_gen_c = tag_kind(ancestor.getparent().tag) == DSC # because all 1st gen 'c'/cxx' are direct children of <dsc>
+    #is_series = ancestor.attrib.get('level') == 'series' # because not all first_gen_c's are an archival 'series'
+
+    did_element = ancestor.find("./ns:did", namespaces=namespaces)
+    if did_element is None:
+        return None
+
+    unittitle_element = did_element.find("./ns:unittitle", namespaces=namespaces)
+    unittitle = " ".join(unittitle_element.itertext()).strip() if unittitle_element is not None else "X" # arbitrary to ensure return type str 
+
+    unitid_element = did_element.find("./ns:unitid", namespaces=namespaces)
+    if is_first_gen_c and unitid_element is not None:  # if unitid in first_gen_c, it MUST be @level="series"
+        unitid_text = unitid_element.text
+        try:
+            unitid = int(unitid_text)
+            if unitid <= 40:  # Convert to Roman only if unitid is an integer and the integer is up to 40
+                roman_numeral = convert_to_roman(unitid)
+                return f"Series {roman_numeral}. {unittitle}"
+            else:
+                return unittitle
+        except ValueError:  # For non-integer unitids
+            return f"Series {unitid_text}. {unittitle}"
+    else:
+        return unittitle
+
 def convert_to_roman(num):
     # Purpose: Converts integer series numbers to Roman numerals in keeping with the traditional presentation of archival series information.
     # I can't seem to get Roman module to work for me. This will do for now because I haven't yet worked with a collection with more than 12 series
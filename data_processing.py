@@ -9,41 +9,268 @@ populating data frames, and handling series and box selection processes.
 """
 import os
 import logging
-from lxml import etree as ET
 import re
 import datetime 
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from lxml import etree as ET
 
-from data_extraction import extract_box_number, extract_folder_date, extract_base_folder_title, extract_ancestor_data
+from data_extraction import tag_kind, component_tags, C_COMPONENT, DID, cached_ancestor_label, extract_ancestor_data, extract_did_fields
 from user_interaction import display_options, parse_user_input
 from filtering import filter_df, filter_df_by_box_values
-from utils import custom_sort_key
+from utils import box_sort_order, custom_sort_keys, sort_permutation
+
+# Bump whenever the folder rows produced for the same EAD change, so cached rows (folder_cache) are not reused
+EXTRACTOR_VERSION = 2
+
+# Folder columns whose values repeat from row to row; FolderRows stores each distinct value once and shares it
+REPEATED_FOLDER_COLUMNS = {'COLLECTION', 'CALL_NO.', 'BOX', 'FOLDER', 'CONTAINER_TYPE',
+                           'C01_ANCESTOR', 'C02_ANCESTOR', 'C03_ANCESTOR', 'C04_ANCESTOR', 'C05_ANCESTOR', 'FOLDER DATES'}
+
+# Folder columns with a few distinct values per collection, stored as pandas categoricals until the Excel export
+CATEGORICAL_FOLDER_COLUMNS = ['COLLECTION', 'CALL_NO.', 'BOX', 'CONTAINER_TYPE',
+                              'C01_ANCESTOR', 'C02_ANCESTOR', 'C03_ANCESTOR', 'C04_ANCESTOR', 'C05_ANCESTOR']
+
+def encode_label_columns(folder_df):
+    """Stores the CATEGORICAL_FOLDER_COLUMNS of folder_df as categoricals (e.g. again after a concat of frames with
+    different categories made them object columns). Returns folder_df, changed in place"""
+    for column in CATEGORICAL_FOLDER_COLUMNS:
+        if column in folder_df.columns and not isinstance(folder_df[column].dtype, pd.CategoricalDtype):
+            folder_df[column] = folder_df[column].astype('category')
+    return folder_df
+
+def concat_folder_frames(frames):
+    """pd.concat of folder DataFrames, skipping empty ones, with CATEGORICAL_FOLDER_COLUMNS kept categorical: each
+    frame's column is given the union of all frames' categories first, as frames with different categories (or a
+    column with no values at all) would be concatenated as object columns, with a FutureWarning from pandas"""
+    frames = [frame for frame in frames if not frame.empty] or frames[:1]
+    if len(frames) == 1:
+        return encode_label_columns(frames[0].copy())
+    label_dtypes = {}
+    for column in CATEGORICAL_FOLDER_COLUMNS:
+        if column in frames[0].columns:
+            values = [frame[column].cat.categories if isinstance(frame[column].dtype, pd.CategoricalDtype) else frame[column].dropna().unique()
+                      for frame in frames]
+            label_dtypes[column] = pd.CategoricalDtype(pd.Index(np.concatenate([np.asarray(value, dtype=object) for value in values])).unique())
+    return pd.concat([frame.astype(label_dtypes) for frame in frames], ignore_index=True)
+
+def decode_label_columns(df):
+    """A copy of df whose categorical columns are plain object columns again, with None in empty cells, for export"""
+    return df.assign(**{column: df[column].astype(object).where(df[column].notna(), None)
+                        for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)})
+
+def format_distinct(numbers, format_number):
+    """format_number of each integer in numbers, as an object array, calling format_number once per distinct number"""
+    distinct, inverse = np.unique(numbers, return_inverse=True)
+    formatted = np.empty(len(distinct), dtype=object)
+    formatted[:] = [format_number(number) for number in distinct.tolist()]
+    return formatted[inverse]
+
+class FolderRows:
+    """Column-wise accumulator for folder rows: each terminal component is recorded once, as one row of values and
+    the number of folder rows it stands for, and all folder rows are generated together when the DataFrame is built
+    (see to_dataframe), instead of appending "folders 1-300" to folder_df one row at a time.
+    Values of REPEATED_FOLDER_COLUMNS are interned, so e.g. a box number or series title read from a thousand
+    components is kept as one string referenced a thousand times (also in the DataFrame and the pickled cache)."""
+    __slots__ = ('columns', 'values', 'interned', 'distinct_values', 'counts', 'first_folders', 'numbered_titles', 'row_count')
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.values = [[] for _ in self.columns]
+        self.interned = [column in REPEATED_FOLDER_COLUMNS for column in self.columns]
+        self.distinct_values = {}
+        self.counts = []
+        self.first_folders = []  # -1 when the component's FOLDER value is used as is
+        self.numbered_titles = []
+        self.row_count = 0
+
+    def append(self, row, count=1, first_folder=None, numbered_titles=False):
+        """Records a component standing for count folder rows with the values of row. With first_folder, their FOLDER
+        is first_folder, first_folder + 1, ...; with numbered_titles, their FOLDER TITLE ends in " [i of count]"."""
+        distinct_values = self.distinct_values
+        for column_values, interned, value in zip(self.values, self.interned, row):
+            if interned:
+                value = distinct_values.setdefault(value, value)
+            column_values.append(value)
+        self.counts.append(count)
+        self.first_folders.append(-1 if first_folder is None else first_folder)
+        self.numbered_titles.append(numbered_titles)
+        self.row_count += count
+
+    def __len__(self):
+        return self.row_count
+
+    def to_dataframe(self, folder_df=None):
+        """The accumulated rows as one DataFrame (CATEGORICAL_FOLDER_COLUMNS as categoricals, the others object),
+        after the rows already in folder_df if one is given. Every column is expanded from one value per component
+        with a single repeat; folder numbers and "[i of n]" titles come from each row's offset within its component."""
+        counts = np.array(self.counts, dtype=np.int64)
+        component_of_row = np.repeat(np.arange(len(counts)), counts)
+        offsets = np.arange(len(component_of_row)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        columns = {}
+        for column, values in zip(self.columns, self.values):
+            if column in CATEGORICAL_FOLDER_COLUMNS:
+                categorical = pd.Categorical(values)
+                columns[column] = pd.Categorical.from_codes(categorical.codes[component_of_row], dtype=categorical.dtype)
+            else:
+                component_values = np.empty(len(values), dtype=object)
+                component_values[:] = values
+                columns[column] = component_values[component_of_row]
+
+        numbered_folders = np.repeat(np.array(self.first_folders, dtype=np.int64) >= 0, counts)
+        if numbered_folders.any():
+            folder_numbers = np.repeat(np.array(self.first_folders, dtype=np.int64), counts)[numbered_folders] + offsets[numbered_folders]
+            columns['FOLDER'][numbered_folders] = format_distinct(folder_numbers, str)
+        numbered_titles = np.repeat(np.array(self.numbered_titles, dtype=bool), counts)
+        if numbered_titles.any():
+            component_titles = np.empty(len(counts), dtype=object)
+            component_titles[:] = [str(title) for title in self.values[self.columns.index('FOLDER TITLE')]]  # as f"{title}" would, e.g. None -> "None"
+            totals = counts[component_of_row[numbered_titles]]
+            # one " [i of n]" string per distinct (i, n), encoded as a single integer
+            key_base = int(totals.max()) + 1
+            suffixes = format_distinct(offsets[numbered_titles] * key_base + totals, lambda key: f" [{key // key_base + 1} of {key % key_base}]")
+            columns['FOLDER TITLE'][numbered_titles] = component_titles[component_of_row[numbered_titles]] + suffixes
+
+        rows_df = pd.DataFrame(columns, columns=self.columns)
+        if folder_df is not None and not folder_df.empty:
+            return concat_folder_frames([folder_df, rows_df])
+        return rows_df
+
+# One terminal component as seen by the selection-first pre-scan: its C01 series, the position of its top-level
+# component in the <dsc> and its own position among that component's leaves, the containers and extents of its <did>
+# (no titles or dates) and the folder rows it stands for. component and did_element are None when the pre-scan streamed the EAD.
+TerminalLeaf = namedtuple('TerminalLeaf', ['component', 'did_element', 'series', 'series_position', 'leaf_position', 'did_fields', 'explicit', 'row_count'])
 
 def is_terminal_node(node):
     """Determines if a node is a terminal node by checking its children."""
     for child in node:
-        tag = ET.QName(child.tag).localname
-        if re.match(r'c\d{0,2}$|^c$', tag): 
+        if tag_kind(child.tag) == C_COMPONENT:
             return False
     return True
 
-def has_explicit_folder_numbering(did_element, containers, ancestor_data, folder_df, namespaces):
-    """populates df when folders are explicitly numbered
-    This function supplies folder numbers as string/text
-    ancester_data is set to None because some terminal c nodes representing file level description are no series yet have no ancestor c nodes"""
-    
-    folder_container = next(elem for elem in containers if elem.attrib.get('type', '').lower() == 'folder')
-    folder_text = folder_container.text.lower()
-    box_number = extract_box_number(did_element, namespaces)
-    container_element = did_element.find('./ns:container', namespaces=namespaces)  # find the container element
-    container_type = container_element.attrib.get('altrender', None) if container_element is not None else None  # get altrender attribute, if it exists
-    base_title = extract_base_folder_title(did_element, namespaces)
-    date = extract_folder_date(did_element, namespaces)
+def iter_terminal_components(dsc_element, namespaces, label_cache=None):
+    """Single stack-based walk over <dsc>, in document order: yields (component, did_element, ancestor_data) for every
+    terminal <c>/<cxx>. Ancestor labels are formatted once per ancestor on the way down and shared by its descendants,
+    so the walk is linear in the size of <dsc> however deep the hierarchy goes.
+    ancestor_data is None where the per-leaf extract_ancestor_data rules must be applied instead (no <did>, a <did>
+    nested below the component, or an ancestor whose label could not be formatted)."""
+    stack = [(child, ()) for child in reversed(dsc_element)]
+    while stack:
+        elem, ancestor_labels = stack.pop()
+        kind = tag_kind(elem.tag)
+        if kind == C_COMPONENT:
+            if is_terminal_node(elem):
+                did_element = elem.find('.//ns:did', namespaces=namespaces)
+                if did_element is not None and did_element.getparent() is elem and ancestor_labels is not None:
+                    yield elem, did_element, list(ancestor_labels)  # fresh list per leaf: the row builders pad it in place
+                else:
+                    yield elem, did_element, None
 
-    ancestor_values = ancestor_data
-    ancestor_values += [None] * (5 - len(ancestor_values)) # '5' for the 5 <cxx> ancestor columns in folder_df
-    
-    start, end = None, None
-    # if a range of folders
+            children = [child for child in elem if tag_kind(child.tag) != DID]
+            if children:  # <did> never holds components, everything else might
+                if ancestor_labels is not None and len(ancestor_labels) < 5: # '5' for the 5 <cxx> ancestor columns in folder_df
+                    try:
+                        label = cached_ancestor_label(elem, namespaces, label_cache)
+                        if label is not None:
+                            ancestor_labels = ancestor_labels + (label,)
+                    except Exception:
+                        ancestor_labels = None
+                stack.extend((child, ancestor_labels) for child in reversed(children))
+        else:
+            stack.extend((child, ancestor_labels) for child in reversed(elem))
+
+def iter_leaf_components(dsc_element, namespaces, label_cache=None):
+    """Cheaper walk than iter_terminal_components for the pre-scan, which only needs each leaf's C01 series rather than
+    all five ancestor labels: yields (component, did_element, series_position, leaf_position, series_data) for every
+    terminal <c>/<cxx> in document order. series_position counts the components directly below <dsc> (the spans of the
+    series index), None for a leaf below anything else; leaf_position counts the leaves below the same <dsc> child.
+    series_data is [C01 label], [] for a top-level leaf, or None where extract_ancestor_data must be applied instead,
+    as iter_terminal_components' ancestor_data."""
+    tags = component_tags(namespaces)
+    did_tag = ET.QName(namespaces['ns'], 'did').text
+    series_position = -1
+    for top in dsc_element:
+        top_is_component = tag_kind(top.tag) == C_COMPONENT
+        series_label = None
+        if top_is_component:
+            series_position += 1
+            try:
+                series_label = cached_ancestor_label(top, namespaces, label_cache)
+            except Exception:
+                pass
+        leaf_position = -1
+        for elem in top.iter(tags):
+            if not is_terminal_node(elem):
+                continue
+            leaf_position += 1
+            did_element = next(elem.iter(did_tag), None)
+            if did_element is None or did_element.getparent() is not elem:
+                series_data = None
+            elif elem is top:
+                series_data = []
+            else:
+                series_data = [series_label] if series_label is not None else None
+            yield elem, did_element, series_position if top_is_component else None, leaf_position, series_data
+
+def process_terminal_components(terminal_components, folder_rows, namespaces, label_cache, collection_name, call_number):
+    """Adds the folder rows of every (component, did_element, ancestor_data) to folder_rows (a FolderRows), reporting components that
+    cannot be read and carrying on. Returns (has_explicit_folder_numbering_count, has_implicit_folder_numbering_count)."""
+    has_explicit_folder_numbering_count = 0
+    has_implicit_folder_numbering_count = 0
+
+    for elem, did_element, ancestor_data in terminal_components:
+        try:
+            if ancestor_data is None:  # not precomputed by the traversal
+                ancestor_data = extract_ancestor_data(did_element, namespaces, label_cache)
+
+            if did_element is not None:
+                did_fields = extract_did_fields(did_element, namespaces)  # one pass over the <did> for everything the rows need
+
+                if is_explicitly_numbered(did_fields):
+                    has_explicit_folder_numbering(did_fields, ancestor_data, folder_rows, collection_name, call_number)
+                    has_explicit_folder_numbering_count += 1
+                else:
+                    has_implicit_folder_numbering(did_fields, ancestor_data, folder_rows, collection_name, call_number)
+                    has_implicit_folder_numbering_count += 1
+
+        except Exception as e:
+            report_hiccup(elem, e, namespaces)
+
+    return has_explicit_folder_numbering_count, has_implicit_folder_numbering_count
+
+def report_hiccup(elem, e, namespaces):
+    """Tells the user which component could not be turned into folder rows"""
+    title_text = ""
+    date_text = ""
+    try:
+        did_element = elem.find('.//ns:did', namespaces=namespaces)
+        if did_element is not None:
+            unittitle_elem = did_element.find('ns:unittitle', namespaces=namespaces)
+            if unittitle_elem is not None:
+                title_text = " ".join(unittitle_elem.itertext()).strip()
+            unitdate_elem = did_element.find('ns:unitdate', namespaces=namespaces)
+            if unitdate_elem is not None:
+                date_text = unitdate_elem.text or ""
+
+        if not title_text:
+            title_text = "Title unavailable"
+        if not date_text:
+            date_text = "Date unavailable"
+
+    except Exception:
+        title_text = "Error extracting title"
+        date_text = "Error extracting date"
+
+    print(f"Ran into a hiccup with a component titled '{title_text}' from {date_text}: {str(e)}\nI'll keep working though")
+
+def is_explicitly_numbered(did_fields):
+    """True when a terminal <did> numbers its folders itself: a folder container alongside at least one other container"""
+    return len(did_fields.container_types) >= 2 and 'folder' in did_fields.container_types
+
+def explicit_folder_range(folder_text):
+    """(start, end) for a folder range such as 'folders 3-5', or None for a single folder; raises ValueError on malformed ranges"""
     if '-' in folder_text:
         # Split and filter non-numeric characters
         start, end = folder_text.split('-')
@@ -51,86 +278,118 @@ def has_explicit_folder_numbering(did_element, containers, ancestor_data, folder
         end = re.sub(r'\D', '', end)
 
         # Convert to integers
-        start, end = int(start), int(end)
-        
-        for i in range(start, end + 1):
-            folder_title = f"{base_title} [{i - start + 1} of {end - start + 1}]"
-            df_row = [folder_df['COLLECTION'][0], folder_df['CALL_NO.'][0], box_number, str(i), container_type] + ancestor_values + [folder_title, date]
-            folder_df.loc[len(folder_df)] = df_row
+        return int(start), int(end)
+    return None
+
+def implicit_folder_count(did_fields):
+    """First positive integer in the <physdesc>/<extent> texts of a terminal <did>, or None"""
+    for extent_text in did_fields.extents:
+        integer_match = re.search(r'\b[1-9]\d*\b', extent_text) # Modified regex to exclude zero
+        if integer_match:
+            return int(integer_match.group())  # Stop after finding the first valid integer
+    return None
+
+def count_folder_rows(did_fields, explicit):
+    """How many folder rows has_explicit/has_implicit_folder_numbering would add for this <did>, without adding them.
+    Raises wherever they would raise."""
+    if explicit:
+        folder_range = explicit_folder_range(did_fields.folder_text.lower())
+        return max(folder_range[1] - folder_range[0] + 1, 0) if folder_range is not None else 1
+    folder_count = implicit_folder_count(did_fields)
+    return folder_count if folder_count is not None else 1
+
+def has_explicit_folder_numbering(did_fields, ancestor_data, folder_rows, collection_name, call_number):
+    """populates df when folders are explicitly numbered
+    This function supplies folder numbers as string/text
+    ancester_data is set to None because some terminal c nodes representing file level description are no series yet have no ancestor c nodes
+    did_fields is the DidFields record read from the terminal <did> by extract_did_fields; rows go to folder_rows (a FolderRows)"""
+    
+    folder_text = did_fields.folder_text.lower()
+    box_number = did_fields.box
+    container_type = did_fields.container_type
+    base_title = did_fields.title
+    date = did_fields.date
+
+    ancestor_values = ancestor_data
+    ancestor_values += [None] * (5 - len(ancestor_values)) # '5' for the 5 <cxx> ancestor columns in folder_df
+    
+    folder_range = explicit_folder_range(folder_text)
+    # if a range of folders, recorded once and expanded to one row per folder by folder_rows
+    if folder_range is not None:
+        start, end = folder_range
+        df_row = [collection_name, call_number, box_number, None, container_type] + ancestor_values + [base_title, date]
+        folder_rows.append(df_row, count=max(end - start + 1, 0), first_folder=start, numbered_titles=True)
     else:
         folder_number = folder_text
-        df_row = [folder_df['COLLECTION'][0], folder_df['CALL_NO.'][0], box_number, folder_number, container_type] + ancestor_values + [base_title, date]
-        folder_df.loc[len(folder_df)] = df_row
+        df_row = [collection_name, call_number, box_number, folder_number, container_type] + ancestor_values + [base_title, date]
+        folder_rows.append(df_row)
 
-def has_implicit_folder_numbering(did_element, ancestor_data, folder_df, namespaces):
+def has_implicit_folder_numbering(did_fields, ancestor_data, folder_rows, collection_name, call_number):
     """ populates df row when either folders are not numbered or 'folder(s)' is not mentioned at all.
     The function does not supply folder numbers, hence "None" at idx 3 in df_row population
     I've seen a situation where there's more than 2 <physdesc> inside one terminal node "Hello Henri Chopin!"
     But anyways, that would rarely be a problem because it'll most likely be because it wouldn't be about physical folders, perhaps intangible discrete items
-    ancester_data is set to None because some terminal c nodes representing file level description are no series yet have no ancestor c nodes"""
+    ancester_data is set to None because some terminal c nodes representing file level description are no series yet have no ancestor c nodes
+    did_fields is the DidFields record read from the terminal <did> by extract_did_fields; rows go to folder_rows (a FolderRows)"""
     
-    box_number = extract_box_number(did_element, namespaces)
-    container_element = did_element.find('./ns:container', namespaces=namespaces)  # find the container element
-    container_type = container_element.attrib.get('altrender', None) if container_element is not None else None  # get altrender attribute, if it exists
-    base_title = extract_base_folder_title(did_element, namespaces)
-    date = extract_folder_date(did_element, namespaces)
+    box_number = did_fields.box
+    container_type = did_fields.container_type
+    base_title = did_fields.title
+    date = did_fields.date
 
     ancestor_values = ancestor_data
     ancestor_values += [None] * (5 - len(ancestor_values)) # '5' for the 5 <cxx> ancestor columns in folder_df
     
-    physdesc_elements = did_element.findall('./ns:physdesc/ns:extent', namespaces=namespaces)
-    folder_count = None
-    for extent in physdesc_elements:
-        extent_text = extent.text
-        integer_match = re.search(r'\b[1-9]\d*\b', extent_text) # Modified regex to exclude zero
-        if integer_match:
-            folder_count = int(integer_match.group())
-            break  # Stop after finding the first valid integer
-
-    # Use folder_count to populate df_row
-    if folder_count is not None:
-        if folder_count != 1:
-            for i in range(1, folder_count + 1):
-                folder_title = f"{base_title} [{i} of {folder_count}]"
-                df_row = [folder_df['COLLECTION'][0], folder_df['CALL_NO.'][0], box_number, None, container_type] + ancestor_values + [folder_title, date]
-                folder_df.loc[len(folder_df)] = df_row
-        else:
-            df_row = [folder_df['COLLECTION'][0], folder_df['CALL_NO.'][0], box_number, None, container_type] + ancestor_values + [base_title, date]
-            folder_df.loc[len(folder_df)] = df_row
+    folder_count = implicit_folder_count(did_fields)
+
+    # Use folder_count to populate df_row, recorded once and expanded to one row per folder by folder_rows
+    df_row = [collection_name, call_number, box_number, None, container_type] + ancestor_values + [base_title, date]
+    if folder_count is not None and folder_count != 1:
+        folder_rows.append(df_row, count=folder_count, numbered_titles=True)
     else:
-        # Handle the case where no valid folder count is found
-        df_row = [folder_df['COLLECTION'][0], folder_df['CALL_NO.'][0], box_number, None, container_type] + ancestor_values + [base_title, date]
-        folder_df.loc[len(folder_df)] = df_row
+        # a single folder, or no valid folder count found
+        folder_rows.append(df_row)
 
-def process_series_selection(folder_df, box_df, working_directory, collection_name, call_number):
-    series_data = folder_df['C01_ANCESTOR'].unique()
+def box_group(box):
+    """Which folders finalize_dataframes sorts (and so numbers and counts) together with the folders of box: those of
+    every box with the same box_sort_order. Folders without a box form one group of their own."""
+    return box_sort_order(box) if box is not None else None
 
-    # Check if NaN values are present
-    unknown_series_present = folder_df['C01_ANCESTOR'].isna().any()
+UNKNOWN_SERIES_OPTION = 'Unknown series (CAUTION: choosing this might cause unexpected behavior in the program)'
 
-    # Custom sort function for series data
-    def sort_key(series_name):
-        
-        if series_name is None:# Handle None values first
-            return (2, None)  # 2 ensures None values are sorted to the end
-
-        # Check if the series name matches the date pattern
-        date_match = re.search(r'(\w+)\s+(\d{4})\s+acquisition', series_name)
-        if date_match:
-            # Extract and convert date to datetime object for sorting
-            month, year = date_match.groups()
-            date = datetime.datetime.strptime(f'{month} {year}', '%B %Y')
-            return (1, date)  # 1 ensures date values are sorted after standard values
-        else:
-            # Standard series name (no date), sort alphabetically
-            return (0, series_name.lower())  # 0 ensures standard values are sorted first
+def series_sort_key(series_name):
+    """Custom sort function for series data"""
+    if series_name is None:# Handle None values first
+        return (2, None)  # 2 ensures None values are sorted to the end
 
-    # Sort series data using the custom sort function
-    ordered_series = sorted(series_data, key=sort_key)
+    # Check if the series name matches the date pattern
+    date_match = re.search(r'(\w+)\s+(\d{4})\s+acquisition', series_name)
+    if date_match:
+        # Extract and convert date to datetime object for sorting
+        month, year = date_match.groups()
+        date = datetime.datetime.strptime(f'{month} {year}', '%B %Y')
+        return (1, date)  # 1 ensures date values are sorted after standard values
+    else:
+        # Standard series name (no date), sort alphabetically
+        return (0, series_name.lower())  # 0 ensures standard values are sorted first
+
+def ordered_series_options(series_data, unknown_series_present):
+    """Series names in display order, with the 'Unknown series' option last when some folders have no series"""
+    ordered_series = sorted(series_data, key=series_sort_key)
 
     # Append 'Unknown series' only if NaN values were present
     if unknown_series_present:
-        ordered_series.append('Unknown series (CAUTION: choosing this might cause unexpected behavior in the program)')
+        ordered_series.append(UNKNOWN_SERIES_OPTION)
+    return ordered_series
+
+def process_series_selection(folder_df, box_df, working_directory, collection_name, call_number):
+    series_data = decode_label_columns(folder_df[['C01_ANCESTOR']])['C01_ANCESTOR'].unique()
+
+    # Check if NaN values are present
+    unknown_series_present = folder_df['C01_ANCESTOR'].isna().any()
+
+    # Sort series data using the custom sort function
+    ordered_series = ordered_series_options(series_data, unknown_series_present)
 
     display_options(ordered_series, "series")
 
@@ -154,8 +413,8 @@ def process_series_selection(folder_df, box_df, working_directory, collection_na
 
                 filtered_folder_df_by_series_path = os.path.join(working_directory, f"{collection_name}_{call_number}_folders_by_series_specified.xlsx")
                 filtered_box_df_by_series_path = os.path.join(working_directory, f"{collection_name}_{call_number}_boxes_by_series_specified.xlsx")
-                filtered_folder_df_by_series.to_excel(filtered_folder_df_by_series_path, index=False)
-                filtered_box_df_by_series.to_excel(filtered_box_df_by_series_path, index=False)
+                decode_label_columns(filtered_folder_df_by_series).to_excel(filtered_folder_df_by_series_path, index=False)
+                decode_label_columns(filtered_box_df_by_series).to_excel(filtered_box_df_by_series_path, index=False)
 
                 return filtered_folder_df_by_series_path, filtered_box_df_by_series_path
             else:
@@ -165,7 +424,7 @@ def process_series_selection(folder_df, box_df, working_directory, collection_na
             return None, None
 
 def process_box_selection(box_df, folder_df, working_directory, collection_name, call_number):
-    box_list = sorted(box_df['BOX'].tolist(), key=custom_sort_key)
+    box_list = box_df['BOX'].take(sort_permutation(custom_sort_keys(box_df['BOX']))).tolist()
     
     # Display options in columns
     num_columns = (len(box_list) + 29) // 30  # Calculate the number of columns needed
@@ -196,8 +455,8 @@ def process_box_selection(box_df, folder_df, working_directory, collection_name,
                 # Save to Excel and return file paths
                 filtered_folder_df_by_box_path = os.path.join(working_directory, f"{collection_name}_{call_number}_folders_by_box_specified.xlsx")
                 filtered_box_df_by_box_path = os.path.join(working_directory, f"{collection_name}_{call_number}_boxes_by_box_specified.xlsx")
-                filtered_folder_df_by_box.to_excel(filtered_folder_df_by_box_path, index=False)
-                filtered_box_df_by_box.to_excel(filtered_box_df_by_box_path, index=False)
+                decode_label_columns(filtered_folder_df_by_box).to_excel(filtered_folder_df_by_box_path, index=False)
+                decode_label_columns(filtered_box_df_by_box).to_excel(filtered_box_df_by_box_path, index=False)
 
                 return filtered_folder_df_by_box_path, filtered_box_df_by_box_path
             else:
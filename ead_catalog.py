@@ -0,0 +1,142 @@
+# ead_catalog.py
+
+"""
+Module for the persistent EAD catalog.
+
+This module keeps a small SQLite database in the working directory that remembers, for every XML file seen,
+whether it is an EAD, its collection-level header fields and a hash of its content. Entries are keyed by path
+and trusted only while the file's size and modification time are unchanged, so a launch only rescans files
+that are new or have been edited since the last run. The same rules apply to the byte-offset series index
+of large EADs (see series_index), which is stored in two further tables.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+
+CATALOG_FILENAME = "ead_catalog.sqlite"
+HEADER_COLUMNS = ["name", "number", "repository", "author"]
+
+def open_catalog(working_directory):
+    '''Opens (creating if needed) the catalog database in the working directory. A corrupt database is deleted and
+    recreated, as the catalog is only a cache; other sqlite3 errors (e.g. a database locked by another instance) are raised.'''
+    path = os.path.join(working_directory, CATALOG_FILENAME)
+    try:
+        return connect_catalog(path)
+    except sqlite3.OperationalError:
+        raise
+    except sqlite3.DatabaseError as e:
+        logging.error(f"Recreating corrupt EAD catalog {path}: {str(e)}")
+        os.remove(path)
+        return connect_catalog(path)
+
+def connect_catalog(path):
+    catalog = sqlite3.connect(path)
+    try:
+        catalog.execute("""CREATE TABLE IF NOT EXISTS files (
+                               path TEXT PRIMARY KEY, size INTEGER, mtime REAL, content_hash TEXT, is_ead INTEGER,
+                               name TEXT, number TEXT, repository TEXT, author TEXT)""")
+        catalog.execute("""CREATE TABLE IF NOT EXISTS series_indexes (
+                               path TEXT PRIMARY KEY, size INTEGER, mtime REAL, prolog_end INTEGER, root_tag TEXT,
+                               component_count INTEGER)""")
+        # catalogs written before indexes were validated lack component_count; their indexes are rescanned
+        if "component_count" not in {row[1] for row in catalog.execute("PRAGMA table_info(series_indexes)")}:
+            catalog.execute("ALTER TABLE series_indexes ADD COLUMN component_count INTEGER")
+        catalog.execute("""CREATE TABLE IF NOT EXISTS series_spans (
+                               path TEXT, position INTEGER, start INTEGER, end INTEGER, title TEXT, unitid TEXT,
+                               PRIMARY KEY (path, position))""")
+    except sqlite3.Error:
+        catalog.close()  # closed before a corrupt file is removed, which Windows refuses while it is open
+        raise
+    return catalog
+
+def read_catalog(working_directory, file_stats):
+    '''Returns {path: entry} for the files of file_stats ({path: os.stat result}) whose catalog entry is still current.
+    If the catalog cannot be opened or read, the error is logged and nothing is returned, so every file is rescanned.'''
+    entries = {}
+    try:
+        catalog = open_catalog(working_directory)
+        try:
+            for file_path, stat in file_stats.items():
+                entry = lookup_file(catalog, file_path, stat)
+                if entry is not None:
+                    entries[file_path] = entry
+        finally:
+            catalog.close()
+    except (sqlite3.Error, OSError) as e:
+        logging.error(f"Could not read the EAD catalog, rescanning every file: {str(e)}")
+        return {}
+    return entries
+
+def update_catalog(working_directory, file_stats, entries, existing_paths=None):
+    '''Records the entries ({path: entry}) of rescanned files and drops files that are no longer in existing_paths
+    (default: the files of file_stats). Errors are logged only: the files are simply rescanned on the next launch.'''
+    try:
+        catalog = open_catalog(working_directory)
+        try:
+            for file_path, entry in entries.items():
+                record_file(catalog, file_path, file_stats[file_path], entry)
+            prune_catalog(catalog, file_stats if existing_paths is None else existing_paths)
+            catalog.commit()
+        finally:
+            catalog.close()
+    except (sqlite3.Error, OSError) as e:
+        logging.error(f"Could not update the EAD catalog: {str(e)}")
+
+def file_content_hash(file_path, chunk_size=1024 * 1024):
+    '''SHA-256 of the file's bytes, read in chunks.'''
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def lookup_file(catalog, file_path, stat):
+    '''Returns the cached entry for file_path, or None if it is unknown or its size/mtime changed.
+    An entry is a dict with is_ead, content_hash and the header fields (None for non-EADs).'''
+    row = catalog.execute("SELECT size, mtime, content_hash, is_ead, name, number, repository, author FROM files WHERE path = ?",
+                          (os.path.abspath(file_path),)).fetchone()
+    if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime:
+        return None
+    entry = {"is_ead": bool(row[3]), "content_hash": row[2]}
+    entry.update(zip(HEADER_COLUMNS, row[4:]))
+    return entry
+
+def record_file(catalog, file_path, stat, entry):
+    '''Stores (or replaces) the entry for file_path along with the size/mtime it was computed from.'''
+    catalog.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (os.path.abspath(file_path), stat.st_size, stat.st_mtime, entry["content_hash"], int(entry["is_ead"]))
+                    + tuple(entry.get(column) for column in HEADER_COLUMNS))
+
+def lookup_series_index(catalog, file_path, stat):
+    '''Returns the series index saved for file_path, or None if there is none, its size/mtime changed or it was
+    saved without the component count it was validated against.'''
+    path = os.path.abspath(file_path)
+    row = catalog.execute("SELECT size, mtime, prolog_end, root_tag, component_count FROM series_indexes WHERE path = ?", (path,)).fetchone()
+    if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime or row[4] is None:
+        return None
+    spans = [{"start": start, "end": end, "title": title, "unitid": unitid} for start, end, title, unitid in
+             catalog.execute("SELECT start, end, title, unitid FROM series_spans WHERE path = ? ORDER BY position", (path,))]
+    return {"prolog_end": row[2], "root_tag": row[3], "component_count": row[4], "spans": spans}
+
+def record_series_index(catalog, file_path, stat, series_index):
+    '''Stores (or replaces) the series index of file_path along with the size/mtime it was computed from.'''
+    path = os.path.abspath(file_path)
+    catalog.execute("INSERT OR REPLACE INTO series_indexes VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, stat.st_size, stat.st_mtime, series_index["prolog_end"], series_index["root_tag"], series_index["component_count"]))
+    catalog.execute("DELETE FROM series_spans WHERE path = ?", (path,))
+    catalog.executemany("INSERT INTO series_spans VALUES (?, ?, ?, ?, ?, ?)",
+                        [(path, position, span["start"], span["end"], span["title"], span["unitid"])
+                         for position, span in enumerate(series_index["spans"])])
+
+def prune_catalog(catalog, existing_paths):
+    '''Drops entries (and series indexes) for files that are no longer in the working directory.'''
+    existing = {os.path.abspath(path) for path in existing_paths}
+    stale = [path for (path,) in catalog.execute("SELECT path FROM files") if path not in existing]
+    stale += [path for (path,) in catalog.execute("SELECT path FROM series_indexes") if path not in existing and path not in stale]
+    catalog.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in stale])
+    catalog.executemany("DELETE FROM series_indexes WHERE path = ?", [(path,) for path in stale])
+    catalog.executemany("DELETE FROM series_spans WHERE path = ?", [(path,) for path in stale])
+    if stale:
+        logging.info(f"Removed {len(stale)} vanished file(s) from the EAD catalog")
@@ -9,11 +9,16 @@ and managing the organization of the processed data.
 """
 
 import logging
+import pandas as pd
 
 def filter_df(selected_criteria, full_df, criteria_columns):
     '''Filter a DataFrame based on selected criteria (series or box).'''
     try:
-        filtered_rows = full_df[full_df[criteria_columns].isin(selected_criteria).any(axis=1)]
+        # column by column, so categorical columns are matched on their categories instead of row by row
+        selected_rows = pd.Series(False, index=full_df.index)
+        for column in criteria_columns:
+            selected_rows |= full_df[column].isin(selected_criteria)
+        filtered_rows = full_df[selected_rows]
         return filtered_rows.drop_duplicates()
     except Exception as e:
         logging.error(f"Error filtering DataFrame: {str(e)}")
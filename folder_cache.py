@@ -0,0 +1,65 @@
+# folder_cache.py
+
+"""
+Module for caching extracted folder rows.
+
+This module stores the folder dataframe produced by process_collection (before numbering and finalizing) on disk,
+keyed by the EAD's content hash and the extractor version, so relabeling a finding aid that has already been
+processed skips the XML traversal entirely. The cache directory is kept under a total size limit by evicting the
+least recently used entries.
+"""
+
+import logging
+import os
+import pandas as pd
+
+from data_processing import EXTRACTOR_VERSION
+
+CACHE_DIRNAME = ".folder_row_cache"
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+
+def cache_path(working_directory, content_hash):
+    return os.path.join(working_directory, CACHE_DIRNAME, f"{content_hash}_v{EXTRACTOR_VERSION}.pkl")
+
+def load_cached_rows(working_directory, content_hash):
+    '''Returns the cached folder dataframe for this EAD content, or None on a miss.'''
+    if not content_hash:
+        return None
+    path = cache_path(working_directory, content_hash)
+    try:
+        folder_df = pd.read_pickle(path)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.error(f"Ignoring unreadable folder cache entry {path}: {str(e)}")
+        return None
+    os.utime(path)  # mtime doubles as last-used time for eviction
+    logging.info(f"Loaded {len(folder_df)} folder rows from cache {path}")
+    return folder_df
+
+def store_cached_rows(working_directory, content_hash, folder_df, max_bytes=MAX_CACHE_BYTES):
+    '''Saves the folder dataframe for this EAD content, then evicts least recently used entries over max_bytes.'''
+    if not content_hash:
+        return
+    path = cache_path(working_directory, content_hash)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        folder_df.to_pickle(path + ".tmp")
+        os.replace(path + ".tmp", path)
+        evict_cached_rows(os.path.dirname(path), max_bytes)
+    except Exception as e:
+        logging.error(f"Error writing folder cache entry {path}: {str(e)}")
+
+def evict_cached_rows(cache_directory, max_bytes):
+    entries = []
+    for name in os.listdir(cache_directory):
+        stat = os.stat(os.path.join(cache_directory, name))
+        entries.append((stat.st_mtime, stat.st_size, name))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):  # oldest use first
+        if total_bytes <= max_bytes:
+            break
+        os.remove(os.path.join(cache_directory, name))
+        total_bytes -= size
+        logging.info(f"Evicted {name} from the folder cache")
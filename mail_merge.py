@@ -68,10 +68,11 @@ def perform_mail_merge(wordApp, excel_files, template_name, working_directory):
 
     logging.info("Mail merge process completed.")
 
-def label_selection_menu(wordApp, folder_excel_path, box_excel_path, working_directory, folder_numbering_preference, folders_already_numbered, collection_name):
+def label_selection_menu(wordApp, folder_excel_path, box_excel_path, working_directory, folder_numbering_preference, folders_already_numbered, collection_name, preset_label_type=None):
+    # preset_label_type ('1'-'8') skips the menu and makes a single attempt, for batch runs
     while True:
         try:
-            select_label_type = input("\nPlease choose a number for the type of labels you want, or quit program...\n"
+            select_label_type = preset_label_type if preset_label_type is not None else input("\nPlease choose a number for the type of labels you want, or quit program...\n"
                                             "\n1. DEFAULT folder/box "
                                             "\n2. LEFT label (folder) and DEFAULT box "
                                             "\n3. LEFT label (folder) and CUSTOM box"
@@ -377,4 +378,7 @@ def label_selection_menu(wordApp, folder_excel_path, box_excel_path, working_dir
             else:
                 print(f"\nWrong input: please make a valid selection...")
         except Exception as e:
-            logging.error(f"An error occurred during filtering: {str(e)}")
\ No newline at end of file
+            logging.error(f"An error occurred during filtering: {str(e)}")
+
+        if preset_label_type is not None:
+            break
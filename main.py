@@ -9,24 +9,33 @@ setting up the working directory, initializing data frames, processing collectio
 generating Excel files, and handling label selection.
 """
 
+import contextlib
+import io
 import logging
+import multiprocessing
 import os
+import re
 import sys
+import numpy as np
 import pandas as pd
-import re
-from lxml import etree as ET
-import win32com.client
 
-from xml_processing import process_ead_files, is_terminal_node
-from user_interaction import user_select_collection
-from data_processing import process_series_selection, process_box_selection, has_explicit_folder_numbering, has_implicit_folder_numbering
+from xml_processing import process_ead_files, iterparse_terminal_components
+from user_interaction import user_select_collection, prompt_selection_scope, select_options
+from data_processing import process_series_selection, process_box_selection, iter_terminal_components, iter_leaf_components, box_group
+from data_processing import is_explicitly_numbered, explicit_folder_range, count_folder_rows, TerminalLeaf, ordered_series_options
+from data_processing import process_terminal_components, report_hiccup, FolderRows, encode_label_columns, decode_label_columns
+from filtering import filter_df, filter_df_by_box_values
 from mail_merge import label_selection_menu
-from data_extraction import extract_ancestor_data
-from utils import box_sort_order, prepend_or_fill
+from data_extraction import tag_kind, C_COMPONENT, DSC, extract_ancestor_data, extract_did_fields
+from utils import folder_sort_keys, custom_sort_keys, sort_permutation, prepend_or_fill_column, count_within_runs
+from folder_cache import load_cached_rows, store_cached_rows
+from sharded_extraction import extract_rows_sharded, SHARDING_THRESHOLD_BYTES, default_extraction_workers
+from series_index import load_series_index, parse_series_span
 
 
 # Constants
 NAMESPACES = {'ns': 'urn:isbn:1-931666-22-9'}
+STREAMING_THRESHOLD_BYTES = 20 * 1024 * 1024  # EADs larger than this are extracted with iterparse instead of a full tree
 
 # Logging configuration
 logging.basicConfig(filename='program_log.txt', level=logging.DEBUG, 
@@ -49,8 +58,31 @@ def main():
         # Extract general relevant data
         collection_name, call_number, repository_name, finding_aid_author = extract_collection_info(collection_info)
 
-        # Process and populate dataframes
-        folder_df, box_df = process_collection(collection_info, collection_name, call_number, repository_name, folder_df, box_df, NAMESPACES)
+        # Only some series or boxes wanted: pick them first and build just their folders
+        scope = prompt_selection_scope()
+        if scope is not None:
+            selection = process_selection_first(collection_info, collection_name, call_number, repository_name, scope, NAMESPACES)
+            if selection is None:
+                return
+            folder_df, box_df, folder_numbering_preference, folders_already_numbered = selection
+            excel_file_for_folders, excel_file_for_boxes = generate_excel_files(folder_df, box_df, collection_name, call_number, working_directory, scope)
+            process_label_selection(excel_file_for_folders, excel_file_for_boxes, working_directory, folder_numbering_preference, folders_already_numbered, collection_name)
+            logging.info('Program finished.')
+            check_flagged_labels(folder_df, box_df)
+            input(f"\nPress any key and 'Enter' to exit...")
+            return
+
+        # Process and populate dataframes, unless this exact EAD was already extracted on an earlier run
+        cached_folder_df = load_cached_rows(working_directory, collection_info.get("content_hash"))
+        if cached_folder_df is not None:
+            print(f"\nProcessing {collection_name} : {call_number} (reusing folders extracted on an earlier run)")
+            folder_df = cached_folder_df
+        else:
+            folder_df, box_df = process_collection(collection_info, collection_name, call_number, repository_name, folder_df, box_df, NAMESPACES, workers=default_extraction_workers())
+            store_cached_rows(working_directory, collection_info.get("content_hash"), folder_df)
+        if folder_df.empty:
+            print("\nNo folders could be extracted from this finding aid. Goodbye!\n")
+            return
 
         # Prompt user for folder numbering preference
         folder_numbering_preference, folders_already_numbered = prompt_folder_numbering_preference(folder_df)
@@ -97,84 +129,288 @@ def initialize_box_dataframe():
                                  'FIRST_C01_SERIES', 'SECOND_C01_SERIES', 'THIRD_C01_SERIES', 'FOURTH_C01_SERIES', 'FIFTH_C01_SERIES']).astype('object')
 
 def extract_collection_info(collection_info):
-    # Extract general relevant data from the collection info
-    tree = ET.parse(collection_info["path"])
-    root = tree.getroot()
+    # Extract general relevant data from the collection info (already read from the parsed document during discovery)
     collection_name = collection_info["name"]
     call_number = collection_info["number"]
     repository_name = collection_info["repository"]
     finding_aid_author = collection_info["author"]
     return collection_name, call_number, repository_name, finding_aid_author
 
-def process_collection(collection_info, collection_name, call_number, repository_name, folder_df, box_df, namespaces):
-    # Extract relevant data from the collection info
-    tree = ET.parse(collection_info["path"])
-    root = tree.getroot()
-    dsc_element = root.find('.//ns:dsc', namespaces=namespaces)
+def iter_collection_components(collection_info, namespaces, streaming=None):
+    """Yields (component, did_element, ancestor_data) for every terminal <c>/<cxx> of the collection's <dsc>.
+    streaming=None picks the mode from file size; streaming mode never holds the whole tree in memory"""
+    document = collection_info["document"]
+    if streaming is None:
+        streaming = os.path.getsize(document.path) > STREAMING_THRESHOLD_BYTES
+
+    if streaming:
+        # yields terminal components only, each discarded once its rows are written
+        document.release()
+        terminal_components = iterparse_terminal_components(document.source(), namespaces, document.ancestor_labels) if document.prepare() else []
+    else:
+        # Reuse the tree parsed during discovery rather than parsing the EAD again
+        dsc_element = document.find('.//ns:dsc', namespaces)
+        terminal_components = iter_terminal_components(dsc_element, namespaces, document.ancestor_labels) if dsc_element is not None else []
+
+    yield from terminal_components
+
+def process_collection(collection_info, collection_name, call_number, repository_name, folder_df, box_df, namespaces, streaming=None, workers=1,
+                       catalog_directory=None):
+    # workers > 1 lets a large EAD be extracted series by series in that many processes (see sharded_extraction),
+    # whose series index goes to the catalog in catalog_directory (default: next to the EAD)
+    document = collection_info["document"]
 
     print(f"\nProcessing {collection_name} : {call_number}")
 
-    has_explicit_folder_numbering_count = 0
-    has_implicit_folder_numbering_count = 0
-
-    if dsc_element is not None:
-        all_c_elements = [elem for elem in dsc_element.iterdescendants() if re.match(r'c\d{0,2}$|^c$', ET.QName(elem.tag).localname)]
-
-        for elem in all_c_elements:
-            try:
-                if is_terminal_node(elem):
-                    did_element = elem.find('.//ns:did', namespaces=namespaces)
-                    ancestor_data = extract_ancestor_data(did_element, namespaces)
-
-                    if did_element is not None:
-                        containers = [elem for elem in did_element.iterchildren() if ET.QName(elem.tag).localname == 'container']
-                        container_count = len(containers)
-
-                        has_folder = any(elem.attrib.get('type', '').lower() == 'folder' for elem in containers)
-                        has_box = any(elem.attrib.get('type', '').lower() == 'box' for elem in containers)
-
-                        if container_count >= 2 and has_folder:
-                            has_explicit_folder_numbering(did_element, containers, ancestor_data, folder_df, namespaces)
-                            has_explicit_folder_numbering_count += 1
-                        elif container_count == 1 and has_box:
-                            has_implicit_folder_numbering(did_element, ancestor_data, folder_df, namespaces)
-                            has_implicit_folder_numbering_count += 1
-                        else:
-                            has_implicit_folder_numbering(did_element, ancestor_data, folder_df, namespaces)
-                            has_implicit_folder_numbering_count += 1
-
-            except Exception as e:
-                title_text = ""
-                date_text = ""
-                try:
-                    did_element = elem.find('.//ns:did', namespaces=namespaces)
-                    if did_element is not None:
-                        unittitle_elem = did_element.find('ns:unittitle', namespaces=namespaces)
-                        if unittitle_elem is not None:
-                            title_text = " ".join(unittitle_elem.itertext()).strip()
-                        unitdate_elem = did_element.find('ns:unitdate', namespaces=namespaces)
-                        if unitdate_elem is not None:
-                            date_text = unitdate_elem.text or ""
-
-                    if not title_text:
-                        title_text = "Title unavailable"
-                    if not date_text:
-                        date_text = "Date unavailable"
-
-                except Exception:
-                    title_text = "Error extracting title"
-                    date_text = "Error extracting date"
-
-                print(f"Ran into a hiccup with a component titled '{title_text}' from {date_text}: {str(e)}\nI'll keep working though")
+    counts = None
+    if workers > 1 and os.path.getsize(document.path) > SHARDING_THRESHOLD_BYTES:
+        # series are split from the sanitized bytes, so the sanitizing report is printed once, for the whole EAD
+        file_source = document.file_source()
+        sharded = extract_rows_sharded(file_source, folder_df, namespaces, collection_name, call_number, workers,
+                                       catalog_directory) if file_source else None
+        if sharded is not None:
+            folder_df, counts = sharded
+    if counts is None:
+        # rows are collected column by column and turned into a DataFrame once
+        folder_rows = FolderRows(folder_df.columns)
+        terminal_components = iter_collection_components(collection_info, namespaces, streaming)
+        counts = process_terminal_components(terminal_components, folder_rows, namespaces, document.ancestor_labels, collection_name, call_number)
+        folder_df = folder_rows.to_dataframe(folder_df)
+    has_explicit_folder_numbering_count, has_implicit_folder_numbering_count = counts
 
     if has_implicit_folder_numbering_count > has_explicit_folder_numbering_count:
         print(f"\nOh boy! The folders have not been numbered; maybe I can help ;)\n")
 
     return folder_df, box_df
 
-def prompt_folder_numbering_preference(folder_df):
+def iter_collection_leaves(collection_info, namespaces, streaming):
+    """The pre-scan's traversal: yields (component, did_element, series_position, leaf_position, series_data) for every
+    terminal <c>/<cxx> of the collection's <dsc>, as data_processing.iter_leaf_components does, from the tree or,
+    streaming, with iterparse (series_data is then always left to extract_ancestor_data)."""
+    document = collection_info["document"]
+    if not streaming:
+        dsc_element = document.find('.//ns:dsc', namespaces)
+        if dsc_element is not None:
+            yield from iter_leaf_components(dsc_element, namespaces, document.ancestor_labels)
+        return
+
+    document.release()
+    if not document.prepare():
+        return
+    series_position = leaf_position = -1
+    current_top = None
+    for elem, did_element, _ in iterparse_terminal_components(document.source(), namespaces, document.ancestor_labels):
+        top = elem
+        while tag_kind(top.getparent().tag) != DSC:  # the leaf's ancestors are still open
+            top = top.getparent()
+        top_is_component = tag_kind(top.tag) == C_COMPONENT
+        if top is not current_top:
+            current_top = top
+            series_position += top_is_component
+            leaf_position = -1
+        leaf_position += 1
+        yield elem, did_element, series_position if top_is_component else None, leaf_position, None
+
+def scan_leaves(terminal_leaves, namespaces, label_cache, keep_elements=True):
+    """Reads each (component, did_element, series_position, leaf_position, series_data) of a pre-scan traversal into a TerminalLeaf,
+    reporting components that cannot be read, as process_collection would. keep_elements=False drops the elements
+    (for traversals that discard them once scanned)."""
+    leaves = []
+    for elem, did_element, series_position, leaf_position, series_data in terminal_leaves:
+        try:
+            if series_data is None:  # not read by the traversal
+                series_data = extract_ancestor_data(did_element, namespaces, label_cache)
+
+            if did_element is not None:
+                did_fields = extract_did_fields(did_element, namespaces, text_fields=False)
+                explicit = is_explicitly_numbered(did_fields)
+                row_count = count_folder_rows(did_fields, explicit)
+                series = series_data[0] if series_data else None
+                if not keep_elements:
+                    elem = did_element = None
+                leaves.append(TerminalLeaf(elem, did_element, series, series_position, leaf_position, did_fields, explicit, row_count))
+
+        except Exception as e:
+            report_hiccup(elem, e, namespaces)  # same components, same message as a full process_collection run
+    return leaves
+
+def indexed_series_source(document, namespaces):
+    """(file, series index) for parsing the document's top-level components one at a time, or (None, None) if it
+    has no usable series index (see series_index.load_series_index)."""
+    file_source = document.file_source()
+    series_index = load_series_index(os.path.dirname(os.path.abspath(file_source)), file_source, namespaces) if file_source else None
+    return (file_source, series_index) if series_index is not None else (None, None)
+
+def scan_series_leaves(file_source, series_index, namespaces):
+    """Streaming pre-scan of an EAD with a series index: parses and scans one top-level component at a time, so memory
+    follows the largest series rather than the whole file. None if a series does not parse on its own."""
+    leaves = []
+    for series_position, span in enumerate(series_index["spans"]):
+        dsc_element = parse_series_span(file_source, series_index, span)
+        if dsc_element is None:
+            return None
+        label_cache = {}
+        terminal_leaves = ((elem, did_element, series_position, leaf_position, series_data)
+                           for elem, did_element, _, leaf_position, series_data in iter_leaf_components(dsc_element, namespaces, label_cache))
+        leaves += scan_leaves(terminal_leaves, namespaces, label_cache, keep_elements=False)
+    return leaves
+
+def prescan_collection(collection_info, collection_name, call_number, namespaces, streaming):
+    """Selection-first pre-scan: reads the C01 series and just the containers and extents of every terminal component
+    (no titles, dates or lower ancestor labels) and counts the folder rows each would produce, without building any.
+    Streaming, the EAD is scanned series by series from its series index, or with iterparse if it has none.
+    Returns a list of TerminalLeaf in document order."""
+    document = collection_info["document"]
+
+    print(f"\nScanning {collection_name} : {call_number}")
+
+    leaves = None
+    if streaming:
+        file_source, series_index = indexed_series_source(document, namespaces)
+        if series_index is not None:
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):  # hiccups are only reported once every series could be scanned
+                leaves = scan_series_leaves(file_source, series_index, namespaces)
+            if leaves is not None:
+                print(output.getvalue(), end="")
+    if leaves is None:
+        leaves = scan_leaves(iter_collection_leaves(collection_info, namespaces, streaming), namespaces, document.ancestor_labels,
+                             keep_elements=not streaming)
+
+    if sum(not leaf.explicit for leaf in leaves) > sum(leaf.explicit for leaf in leaves):
+        print(f"\nOh boy! The folders have not been numbered; maybe I can help ;)\n")
+
+    return leaves
+
+def scanned_row_positions(leaves):
+    """Where each folder row of the pre-scanned leaves (in document order) ends up in the table finalize_dataframes
+    sorts, counting from 1, worked out from their boxes and folder numbers alone: continuous numbering of a selection
+    then needs no other folder rows built."""
+    counts = np.array([leaf.row_count for leaf in leaves], dtype=np.int64)
+    first_folders = np.zeros(len(leaves), dtype=np.int64)  # the folder number finalize_dataframes sorts by, 0 for none
+    folder_ranges = np.zeros(len(leaves), dtype=bool)
+    for position, leaf in enumerate(leaves):
+        if leaf.explicit:
+            folder_text = leaf.did_fields.folder_text.lower()
+            folder_range = explicit_folder_range(folder_text)
+            if folder_range is not None:
+                first_folders[position], folder_ranges[position] = folder_range[0], True
+            else:
+                folder_number = re.search(r'\d+', folder_text)
+                first_folders[position] = int(folder_number.group()) if folder_number else 0
+
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    folder_numbers = np.repeat(first_folders, counts) + np.where(np.repeat(folder_ranges, counts), offsets, 0)
+    boxes = np.empty(len(leaves), dtype=object)
+    boxes[:] = [leaf.did_fields.box for leaf in leaves]
+    order = sort_permutation(folder_sort_keys(pd.Series(np.repeat(boxes, counts), dtype=object), folder_numbers))
+    positions = np.empty(len(order), dtype=np.int64)
+    positions[order] = np.arange(1, len(order) + 1)
+    return positions
+
+def build_scanned_rows(collection_info, leaves, needed, collection_name, call_number, namespaces):
+    """Builds the folder rows of the needed pre-scanned leaves (in document order), exactly as process_collection would.
+    A streamed pre-scan kept no elements, so then the top-level components holding needed leaves are parsed again on
+    their own from the series index. Returns the folder dataframe, or None if the rows cannot be built this way (the
+    caller then builds every folder)."""
+    document = collection_info["document"]
+    folder_rows = FolderRows(initialize_folder_dataframe().columns)
+    needed_leaves = [leaf for leaf, is_needed in zip(leaves, needed) if is_needed]
+
+    if needed_leaves[0].component is not None:  # elements of the parsed tree
+        terminal_components = ((leaf.component, leaf.did_element, None) for leaf in needed_leaves)
+        process_terminal_components(terminal_components, folder_rows, namespaces, document.ancestor_labels, collection_name, call_number)
+    else:
+        leaf_positions = {}  # series position -> positions of its needed leaves
+        for leaf in needed_leaves:
+            leaf_positions.setdefault(leaf.series_position, set()).add(leaf.leaf_position)
+        file_source, series_index = indexed_series_source(document, namespaces) if None not in leaf_positions else (None, None)
+        if series_index is None:
+            return None
+        for series_position, wanted in leaf_positions.items():  # in document order, as needed_leaves
+            dsc_element = parse_series_span(file_source, series_index, series_index["spans"][series_position])
+            if dsc_element is None:
+                return None
+            label_cache = {}
+            terminal_components = ((elem, did_element, None) for elem, did_element, _, leaf_position, _
+                                   in iter_leaf_components(dsc_element, namespaces, label_cache) if leaf_position in wanted)
+            process_terminal_components(terminal_components, folder_rows, namespaces, label_cache, collection_name, call_number)
+
+    if len(folder_rows) != sum(leaf.row_count for leaf in needed_leaves):
+        logging.error(f"Folder rows built for the selection do not match the pre-scan of {document.path}, building every folder")
+        return None
+    return folder_rows.to_dataframe()
+
+def process_selection_first(collection_info, collection_name, call_number, repository_name, scope, namespaces, streaming=None):
+    """Lets the user pick series or boxes (scope) from a pre-scan that reads only series and containers, then builds
+    and finalizes the folder rows of the selection and of every box it shares with other folders, so box rows and
+    per-box numbering come out whole; continuous folder numbers come from the pre-scan's row positions. The labels
+    are the same as those of a full run filtered afterwards. Returns (folder_df, box_df, folder_numbering_preference,
+    folders_already_numbered), or None if there is nothing to label or the user quits."""
+    document = collection_info["document"]
+    if streaming is None:
+        streaming = os.path.getsize(document.path) > STREAMING_THRESHOLD_BYTES
+
+    leaves = prescan_collection(collection_info, collection_name, call_number, namespaces, streaming)
+    leaves = [leaf for leaf in leaves if leaf.row_count > 0]
+    if not leaves:
+        print("\nNo folders could be extracted from this finding aid. Goodbye!\n")
+        return None
+
+    if scope == "series":
+        series_values = {leaf.series for leaf in leaves}
+        options = ordered_series_options([series for series in series_values if series is not None], None in series_values)
+        selected_options = select_options(options, "series")
+        if not selected_options:
+            return None
+        selected = [leaf.series in selected_options for leaf in leaves]
+    else:
+        box_labels = {leaf.did_fields.box: f"Box {leaf.did_fields.box}".replace('Box', '').strip() for leaf in leaves}  # as box_df shows them
+        options = pd.Series(sorted(set(box_labels.values())), dtype=object)
+        options = options.take(sort_permutation(custom_sort_keys(options))).tolist()
+        selected_options = select_options(options, "box")
+        if not selected_options:
+            return None
+        selected = [box_labels[leaf.did_fields.box] in selected_options for leaf in leaves]
+
+    # numbering is decided on the whole collection, just as a full run would
+    numbered_rows = sum(leaf.row_count for leaf in leaves if leaf.explicit)
+    folders_already_numbered = numbered_rows > sum(leaf.row_count for leaf in leaves) - numbered_rows
+    folder_numbering_preference, folders_already_numbered = prompt_folder_numbering_preference(folders_already_numbered=folders_already_numbered)
+    continuous_numbering = folders_already_numbered or folder_numbering_preference == "1"
+
+    # every folder of the boxes the selection touches is built, so their box rows and per-box numbering come out whole
+    box_groups = {box: box_group(box) for box in {leaf.did_fields.box for leaf in leaves}}
+    selected_groups = {box_groups[leaf.did_fields.box] for leaf, is_selected in zip(leaves, selected) if is_selected}
+    needed = [box_groups[leaf.did_fields.box] in selected_groups for leaf in leaves]
+    folder_df = build_scanned_rows(collection_info, leaves, needed, collection_name, call_number, namespaces)
+    if folder_df is not None:
+        positions = None
+        if continuous_numbering:
+            positions = scanned_row_positions(leaves)[np.repeat(needed, [leaf.row_count for leaf in leaves])]
+        logging.info(f"Built {len(folder_df)} of {sum(leaf.row_count for leaf in leaves)} folders for the selected {scope}")
+    else:
+        folder_df, _ = process_collection(collection_info, collection_name, call_number, repository_name, initialize_folder_dataframe(),
+                                          initialize_box_dataframe(), namespaces, streaming)
+        positions = None
+    folder_df, box_df = finalize_dataframes(folder_df, initialize_box_dataframe(), collection_name, call_number, repository_name,
+                                            folder_numbering_preference, folders_already_numbered, namespaces, positions)
+
+    # the same filters as process_series_selection / process_box_selection, so both paths give the same labels
+    if scope == "series":
+        folder_df = filter_df(selected_options, folder_df, ['C01_ANCESTOR'])
+        box_df = filter_df(selected_options, box_df, ["FIRST_C01_SERIES", "SECOND_C01_SERIES", "THIRD_C01_SERIES", "FOURTH_C01_SERIES", "FIFTH_C01_SERIES"])
+    else:
+        folder_df = filter_df_by_box_values(folder_df, selected_options, add_prefix=True)
+        box_df = filter_df_by_box_values(box_df, selected_options, add_prefix=False)
+
+    return folder_df, box_df, folder_numbering_preference, folders_already_numbered
+
+def prompt_folder_numbering_preference(folder_df=None, folders_already_numbered=None):
+    # folders_already_numbered can be given instead of folder_df when it was counted without building the rows
     folder_numbering_preference = None
-    folders_already_numbered = folder_df['FOLDER'].notna().sum() > folder_df['FOLDER'].isna().sum()
+    if folders_already_numbered is None:
+        folders_already_numbered = folder_df['FOLDER'].notna().sum() > folder_df['FOLDER'].isna().sum()
     if not folders_already_numbered:
         while True:
             folder_numbering_preference = input("If you want the folders numbered, choose numbering preference or press '3' to exit... \n"
@@ -191,113 +427,106 @@ def prompt_folder_numbering_preference(folder_df):
 
     return folder_numbering_preference, folders_already_numbered
 
-def finalize_dataframes(folder_df, box_df, collection_name, call_number, repository_name, folder_numbering_preference, folders_already_numbered, namespaces):
+def finalize_dataframes(folder_df, box_df, collection_name, call_number, repository_name, folder_numbering_preference, folders_already_numbered, namespaces,
+                        positions=None):
     # Finalizing base folder_df
-    folder_df['sort_order'] = folder_df['BOX'].apply(box_sort_order)
-    folder_df['Folder_temp'] = folder_df['FOLDER'].apply(lambda x: int(re.search(r'\d+', x).group()) if x and re.search(r'\d+', x) else 0)
-    folder_df.sort_values(by=['sort_order', 'Folder_temp'], inplace=True)
+    # folders are ordered by box (see box_sort_order), then by their first folder number; box_df follows this order
+    folder_numbers = pd.to_numeric(folder_df['FOLDER'].astype(object).str.extract(r'(\d+)', expand=False)).fillna(0).astype(int).to_numpy()
+    order = sort_permutation(folder_sort_keys(folder_df['BOX'].astype(object), folder_numbers))
+    folder_df = folder_df.take(order)
 
     # Finalizing base box_df based on folder numbering/user preferences
     if folders_already_numbered or folder_numbering_preference == "1":
-        folder_df['BOX'] = [prepend_or_fill('BOX', val, idx) for idx, val in enumerate(folder_df['BOX'])]
-        folder_df['FOLDER'] = [prepend_or_fill('FOLDER', val, idx) for idx, val in enumerate(folder_df['FOLDER'])]
+        # empty cells are numbered by their position in the sorted table, or in the whole collection's sorted table for
+        # rows of a selection (positions, one per row of folder_df as given, see scanned_row_positions)
+        positions = range(1, len(folder_df) + 1) if positions is None else np.asarray(positions)[order]
+        folder_df['BOX'] = prepend_or_fill_column('BOX', folder_df['BOX'], positions)
+        folder_df['FOLDER'] = prepend_or_fill_column('FOLDER', folder_df['FOLDER'], positions)
         logging.info(f"Preparing dataFrame for {collection_name} boxes")
 
         # Finalizing continuous box_df
-        c01_series_columns = ['FIRST_C01_SERIES', 'SECOND_C01_SERIES', 'THIRD_C01_SERIES', 'FOURTH_C01_SERIES', 'FIFTH_C01_SERIES']
-
-        unique_boxes = folder_df['BOX'].unique()
-        for box in unique_boxes:
-            box_rows = folder_df[folder_df['BOX'] == box]
-
-            folder_per_box_count = box_rows['FOLDER'].count()
-            folder_string = "folder" if folder_per_box_count == 1 else "folders"
-            folder_count = f"{folder_per_box_count} {folder_string}"
-
-            first_folder = min([int(re.search(r'(\d+)', folder).group(1)) for folder in box_rows['FOLDER']])
-            last_folder = max([int(re.search(r'(\d+)', folder).group(1)) for folder in box_rows['FOLDER']])           
-            if first_folder == last_folder:
-                last_folder = None
-
-            box_df.loc[len(box_df), ['BOX', 'FIRST_FOLDER', 'LAST_FOLDER', 'FOLDER_COUNT']] = [box, first_folder, last_folder, folder_count]
-
-            unique_ancestors = box_rows['C01_ANCESTOR'].unique()
-            for i, ancestor in enumerate(unique_ancestors):
-                if i >= len(c01_series_columns):
-                    break
-                box_df.at[len(box_df)-1, c01_series_columns[i]] = ancestor
-
-            unique_container_types = box_rows['CONTAINER_TYPE'].unique()
-            for container_type in unique_container_types:
-                box_df.at[len(box_df)-1, 'CONTAINER_TYPE'] = container_type
-
-            box_df.at[len(box_df)-1, 'REPOSITORY'] = repository_name
-            box_df.at[len(box_df)-1, 'COLLECTION'] = collection_name
-            box_df.at[len(box_df)-1, 'CALL_NO.'] = call_number
+        box_df = aggregate_box_rows(folder_df, box_df, repository_name, collection_name, call_number, folder_range=True)
 
     if folder_numbering_preference == "2":
-        folder_df['BOX'] = "Box " + folder_df['BOX'].astype(str)
-
-        empty_folder_indices = folder_df[folder_df['FOLDER'].isna()].index
-        if not empty_folder_indices.empty:  
-            folder_counter = 1
-            current_box = None
-            for index in empty_folder_indices:
-                row = folder_df.loc[index]
-                if current_box != row['BOX']:
-                    current_box = row['BOX']
-                    folder_counter = 1
-                folder_df.at[index, 'FOLDER'] = f"{folder_counter}"
-                folder_counter += 1
+        # a folder without a box is labeled "Box None" (astype(str) of the categorical column would leave it NaN)
+        boxes = folder_df['BOX'].astype(object)
+        folder_df['BOX'] = "Box " + boxes.where(boxes.notna(), "None").astype(str)
+
+        # unnumbered folders count from 1 again whenever the box changes between them
+        empty_folders = folder_df['FOLDER'].isna()
+        if empty_folders.any():
+            folder_df.loc[empty_folders, 'FOLDER'] = count_within_runs(folder_df.loc[empty_folders, 'BOX']).astype(str)
 
         folder_df['FOLDER'] = "Folder " + folder_df['FOLDER'].astype(str)
 
         # Finalizing non-continuous box_df
-        c01_series_columns = ['FIRST_C01_SERIES', 'SECOND_C01_SERIES', 'THIRD_C01_SERIES', 'FOURTH_C01_SERIES', 'FIFTH_C01_SERIES']
+        box_df = aggregate_box_rows(folder_df, box_df, repository_name, collection_name, call_number, folder_range=False)
 
-        unique_boxes = folder_df['BOX'].unique()
-        for box in unique_boxes:
-            box_rows = folder_df[folder_df['BOX'] == box]
-
-            folder_per_box_count = box_rows['FOLDER'].count()
-            folder_string = "folder" if folder_per_box_count == 1 else "folders"
-            folder_count = f"{folder_per_box_count} {folder_string}"
-
-            box_df.loc[len(box_df), ['BOX', 'FOLDER_COUNT']] = [box, folder_count]
-
-            unique_ancestors = box_rows['C01_ANCESTOR'].unique()
-            for i, ancestor in enumerate(unique_ancestors):
-                if i >= len(c01_series_columns):
-                    break
-                box_df.at[len(box_df)-1, c01_series_columns[i]] = ancestor
-
-            unique_container_types = box_rows['CONTAINER_TYPE'].unique()
-            for container_type in unique_container_types:
-                box_df.at[len(box_df)-1, 'CONTAINER_TYPE'] = container_type
-
-            box_df.at[len(box_df)-1, 'REPOSITORY'] = repository_name
-            box_df.at[len(box_df)-1, 'COLLECTION'] = collection_name
-            box_df.at[len(box_df)-1, 'CALL_NO.'] = call_number
-
-    # Drop temporary columns before finalizing and strip col 'BOX' of "Box"
-    folder_df.drop(columns=['sort_order', 'Folder_temp'], inplace=True) 
+    # Strip col 'BOX' of "Box"
     box_df['BOX'] = box_df['BOX'].apply(lambda x: x.replace('Box', '').strip())
+    encode_label_columns(folder_df)  # the "Box N" labels were built as plain strings
     print(f"\nCounted a total of {len(folder_df)} folder{'s' if len(folder_df) != 1 else ''} in {len(box_df)} box{'es' if len(box_df) != 1 else ''}")
 
     return folder_df, box_df
 
-def generate_excel_files(folder_df, box_df, collection_name, call_number, working_directory):
-    # Generate Excel files for mail merge
+C01_SERIES_COLUMNS = ['FIRST_C01_SERIES', 'SECOND_C01_SERIES', 'THIRD_C01_SERIES', 'FOURTH_C01_SERIES', 'FIFTH_C01_SERIES']
+
+def aggregate_box_rows(folder_df, box_df, repository_name, collection_name, call_number, folder_range):
+    """Appends one row per box to box_df, in the order the boxes first appear in the (sorted) folder_df, using grouped
+    aggregations over the whole table instead of filtering it once per box: FOLDER_COUNT, FIRST_FOLDER and
+    LAST_FOLDER (folder_range only; LAST_FOLDER is None when the box holds a single folder number), the last of the
+    box's distinct CONTAINER_TYPEs, its first five distinct C01 series, and the collection fields"""
+    if folder_df.empty:
+        return box_df
+    boxes = folder_df['BOX']
+    folder_counts = folder_df.groupby(boxes, sort=False, dropna=False)['FOLDER'].count()  # a missing box is a box of its own
+    box_rows = pd.DataFrame({'BOX': folder_counts.index,
+                             'FOLDER_COUNT': [f"{count} {'folder' if count == 1 else 'folders'}" for count in folder_counts]})
+
+    if folder_range:
+        folder_numbers = folder_df['FOLDER'].str.extract(r'(\d+)', expand=False).astype(int)
+        folder_number_groups = folder_numbers.groupby(boxes, sort=False, dropna=False)
+        first_folders = folder_number_groups.min().reindex(folder_counts.index)
+        last_folders = folder_number_groups.max().reindex(folder_counts.index)
+        # object columns, so the folder numbers stay ints and a single-folder box keeps None (not 22.0 / NaN)
+        box_rows['FIRST_FOLDER'] = pd.Series([int(first) for first in first_folders], dtype=object)
+        box_rows['LAST_FOLDER'] = pd.Series([None if first == last else int(last) for first, last in zip(first_folders, last_folders)], dtype=object)
+
+    # the last distinct container type listed for a box wins, as each one overwrote the previous
+    container_types = folder_df[['BOX', 'CONTAINER_TYPE']].drop_duplicates().drop_duplicates(subset='BOX', keep='last')
+    box_rows['CONTAINER_TYPE'] = box_rows['BOX'].map(container_types.set_index('BOX')['CONTAINER_TYPE'])
+
+    series = folder_df[['BOX', 'C01_ANCESTOR']].drop_duplicates()
+    series_position = series.groupby('BOX', sort=False, dropna=False).cumcount()
+    for position, column in enumerate(C01_SERIES_COLUMNS):
+        box_rows[column] = box_rows['BOX'].map(series[series_position == position].set_index('BOX')['C01_ANCESTOR'])
+
+    box_rows['REPOSITORY'] = repository_name
+    box_rows['COLLECTION'] = collection_name
+    box_rows['CALL_NO.'] = call_number
+
+    box_rows = box_rows.reindex(columns=box_df.columns).astype('object')
+    return box_rows if box_df.empty else pd.concat([box_df, box_rows], ignore_index=True)
+
+def generate_excel_files(folder_df, box_df, collection_name, call_number, working_directory, scope=None, source_name=None):
+    # Generate Excel files for mail merge (named like process_series_selection / process_box_selection's for a selection)
+    # source_name (the EAD's file name, in batch mode) tells apart collections that share a title and call number
     logging.info(f"Prepping Excel files for mail merge operation")
-    folder_dataFrame_path = os.path.join(working_directory, f"{collection_name}_{call_number}_folder.xlsx")
-    box_dataFrame_path = os.path.join(working_directory, f"{collection_name}_{call_number}_box.xlsx")
+    file_prefix = f"{collection_name}_{call_number}" if source_name is None else f"{collection_name}_{call_number}_{source_name}"
+    if scope is None:
+        folder_dataFrame_path = os.path.join(working_directory, f"{file_prefix}_folder.xlsx")
+        box_dataFrame_path = os.path.join(working_directory, f"{file_prefix}_box.xlsx")
+    else:
+        folder_dataFrame_path = os.path.join(working_directory, f"{file_prefix}_folders_by_{scope}_specified.xlsx")
+        box_dataFrame_path = os.path.join(working_directory, f"{file_prefix}_boxes_by_{scope}_specified.xlsx")
 
-    folder_df.to_excel(folder_dataFrame_path, index=False)
-    box_df.to_excel(box_dataFrame_path, index=False)
+    decode_label_columns(folder_df).to_excel(folder_dataFrame_path, index=False)
+    decode_label_columns(box_df).to_excel(box_dataFrame_path, index=False)
 
     return folder_dataFrame_path, box_dataFrame_path
 
 def process_label_selection(excel_file_for_folders, excel_file_for_boxes, working_directory, folder_numbering_preference, folders_already_numbered, collection_name):
+    import win32com.client  # only needed to drive Word, so batch runs without labels work without pywin32
     wordApp = win32com.client.Dispatch('Word.Application')
     label_selection_menu(wordApp, excel_file_for_folders, excel_file_for_boxes, working_directory, folder_numbering_preference, folders_already_numbered, collection_name)
 
@@ -308,4 +537,5 @@ def check_flagged_labels(folder_df=None, box_df=None):
             print(f"Goodbye!")
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # worker processes of the PyInstaller executable start here too
     main()
\ No newline at end of file
@@ -0,0 +1,190 @@
+# series_index.py
+
+"""
+Module for the byte-offset index of top-level series.
+
+This module scans the raw bytes of an EAD once to record where each top-level component of the <dsc>
+(normally a <c01> series) starts and ends, together with its title and unitid. The index is saved in the
+EAD catalog and trusted only while the file's size and modification time are unchanged, so later runs can
+parse just the bytes of the series they need instead of the whole finding aid. Markup inside comments, CDATA
+sections and processing instructions is skipped, and an index is only used if it has one span per top-level
+component found by a real parse of the same version of the file.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+from lxml import etree as ET
+
+from ead_catalog import open_catalog, lookup_series_index, record_series_index
+from data_extraction import tag_kind, C_COMPONENT, DSC
+
+# Comments, CDATA sections and processing instructions: consumed by the tag patterns below so that markup inside
+# them is never taken for an element
+SKIPPED_MARKUP = rb'<!--.*?-->|<!\[CDATA\[.*?\]\]>|<\?.*?\?>'
+
+def markup_pattern(tag_pattern):
+    """Compiles SKIPPED_MARKUP | tag_pattern; matches of the tag itself have a 'tag' group, see find_tag."""
+    return re.compile(SKIPPED_MARKUP + rb'|(?P<tag>' + tag_pattern + rb')', re.DOTALL)
+
+# First element start tag of the document (the <ead> root); the declaration and DOCTYPE are skipped too
+ROOT_START_TAG = markup_pattern(rb'<(?P<name>[A-Za-z_][\w.:-]*)[^>]*>')
+DSC_START_TAG = markup_pattern(rb'<(?:[\w.-]+:)?dsc[\s>/]')
+DSC_END_TAG = markup_pattern(rb'</(?:[\w.-]+:)?dsc\s*>')
+# <c>/<cxx> start, end and empty tags, same names as data_extraction.tag_kind's C_COMPONENT
+COMPONENT_TAG = markup_pattern(rb'<(?P<closing>/?)(?:[\w.-]+:)?c\d{0,2}(?=[\s>/])[^>]*?(?P<empty>/?)>')
+DID_END_TAG = markup_pattern(rb'</(?:[\w.-]+:)?did\s*>')
+
+def iter_tags(pattern, data, start=0, end=None):
+    """Yields the matches of a markup_pattern's tag between start and end, skipping comments, CDATA and PIs."""
+    for match in pattern.finditer(data, start, len(data) if end is None else end):
+        if match.group('tag') is not None:
+            yield match
+
+def find_tag(pattern, data, start=0, end=None):
+    """First match of a markup_pattern's tag, or None."""
+    return next(iter_tags(pattern, data, start, end), None)
+
+def scan_series_spans(file_path, namespaces):
+    """Cheap pass over the file's bytes: returns {"prolog_end", "root_tag", "spans"}, where spans lists
+    {"start", "end", "title", "unitid"} for each top-level component of the <dsc>, in document order.
+    Returns None if the file has no <dsc> or its component tags do not balance."""
+    with open(file_path, 'rb') as file:
+        data = file.read()
+
+    root_match = find_tag(ROOT_START_TAG, data)
+    dsc_match = find_tag(DSC_START_TAG, data, root_match.end()) if root_match else None
+    if dsc_match is None:
+        return None
+    dsc_end_match = find_tag(DSC_END_TAG, data, dsc_match.end())
+    dsc_end = dsc_end_match.start() if dsc_end_match else len(data)
+
+    series_index = {"prolog_end": root_match.end(), "root_tag": root_match.group('name').decode('utf-8'), "spans": []}
+    prolog = data[:series_index["prolog_end"]]
+    depth = 0
+    start = None
+    for match in iter_tags(COMPONENT_TAG, data, dsc_match.end(), dsc_end):
+        closing, empty = match.group('closing'), match.group('empty')
+        if not closing:
+            if depth == 0:
+                start = match.start()
+            if not empty:
+                depth += 1
+                continue
+        else:
+            depth -= 1
+            if depth < 0:
+                return None
+        if depth == 0:
+            description = describe_series_span(prolog, series_index["root_tag"], data[start:match.end()], namespaces)
+            series_index["spans"].append({"start": start, "end": match.end(), **description})
+    if depth != 0:
+        return None
+    return series_index
+
+def wrap_series_span(prolog, root_tag, span_data):
+    """A small well-formed document holding one component: the EAD's prolog and root start tag, a <dsc>, the span."""
+    prefix = root_tag.rpartition(':')[0]
+    dsc_tag = f"{prefix}:dsc" if prefix else "dsc"
+    return prolog + f"<{dsc_tag}>".encode('utf-8') + span_data + f"</{dsc_tag}></{root_tag}>".encode('utf-8')
+
+def describe_series_span(prolog, root_tag, span_data, namespaces):
+    """Title and unitid of a component, read from its <did> only (the rest of the span is not parsed)."""
+    did_end = find_tag(DID_END_TAG, span_data)
+    head = span_data[:did_end.end()] if did_end else span_data
+    # recover=True closes the component (and <dsc>) left open by cutting the span after its <did>
+    root = ET.fromstring(wrap_series_span(prolog, root_tag, head), ET.XMLParser(recover=True))
+    component = root.find('./ns:dsc/*', namespaces=namespaces) if root is not None else None
+    unittitle = component.find('./ns:did/ns:unittitle', namespaces=namespaces) if component is not None else None
+    unitid = component.find('./ns:did/ns:unitid', namespaces=namespaces) if component is not None else None
+    return {"title": " ".join(unittitle.itertext()).strip() if unittitle is not None else None,
+            "unitid": unitid.text if unitid is not None else None}
+
+class _SeriesCounter:
+    """Parser target that builds nothing and counts the components directly below the first <dsc>."""
+    def __init__(self):
+        self.count = 0
+        self.depth = None  # depth below <dsc> while inside it
+        self.done = False
+
+    def start(self, tag, attrib):
+        if self.depth is None:
+            if not self.done and tag_kind(tag) == DSC:
+                self.depth = 0
+            return
+        if self.depth == 0 and tag_kind(tag) == C_COMPONENT:
+            self.count += 1
+        self.depth += 1
+
+    def end(self, tag):
+        if self.depth == 0:
+            self.depth, self.done = None, True
+        elif self.depth is not None:
+            self.depth -= 1
+
+    def close(self):
+        return self.count
+
+def count_series_components(file_path):
+    """Number of top-level components of the <dsc> according to a real parse of file_path (no tree is built),
+    or None if the file does not parse."""
+    try:
+        return ET.parse(file_path, ET.XMLParser(target=_SeriesCounter()))
+    except ET.XMLSyntaxError:
+        return None
+
+def load_series_index(working_directory, file_path, namespaces):
+    """Returns the series index of file_path from the EAD catalog, rescanning the file (and saving the result)
+    if it is not indexed yet or has changed since. None if the file cannot be indexed, or if the index does not
+    have one span per top-level component found by a real parse. That parse is done once, when the file is scanned:
+    its component count is saved with the index and trusted for as long as the file's size and mtime are unchanged."""
+    stat = os.stat(file_path)
+    catalog = series_index = None
+    try:
+        catalog = open_catalog(working_directory)
+        series_index = lookup_series_index(catalog, file_path, stat)
+    except (sqlite3.Error, OSError) as e:
+        logging.error(f"Could not read the EAD catalog, indexing {file_path} without it: {str(e)}")
+    try:
+        if series_index is None:
+            series_index = scan_series_spans(file_path, namespaces)
+            if series_index is None:
+                return None
+            series_index["component_count"] = count_series_components(file_path)
+            if series_index["component_count"] is None:
+                return None
+            if series_index["component_count"] != len(series_index["spans"]):
+                logging.error(f"Series index of {file_path} has {len(series_index['spans'])} spans for "
+                              f"{series_index['component_count']} top-level components, not using it")
+            if catalog is not None:
+                try:
+                    record_series_index(catalog, file_path, stat, series_index)  # a mismatch is saved too, so it is not rescanned
+                    catalog.commit()
+                except sqlite3.Error as e:
+                    logging.error(f"Could not save the series index of {file_path} in the EAD catalog: {str(e)}")
+            logging.info(f"Indexed {len(series_index['spans'])} series in {file_path}")
+        if series_index["component_count"] != len(series_index["spans"]):
+            return None
+        return series_index
+    except Exception as e:
+        logging.error(f"Could not index series in {file_path}: {str(e)}")
+        return None
+    finally:
+        if catalog is not None:
+            catalog.close()
+
+def parse_series_span(file_path, series_index, span):
+    """Parses one indexed component on its own and returns the <dsc> wrapping it, or None if its bytes do not parse
+    (callers then fall back to the whole document). file_path should already be sanitized, see EADDocument.file_source."""
+    with open(file_path, 'rb') as file:
+        prolog = file.read(series_index["prolog_end"])
+        file.seek(span["start"])
+        span_data = file.read(span["end"] - span["start"])
+
+    try:
+        root = ET.fromstring(wrap_series_span(prolog, series_index["root_tag"], span_data))
+    except ET.XMLSyntaxError as e:
+        logging.error(f"Could not parse series at bytes {span['start']}-{span['end']} of {file_path}: {str(e)}")
+        return None
+    return root[-1]  # the wrapping <dsc> is the root's only child
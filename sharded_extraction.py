@@ -0,0 +1,88 @@
+# sharded_extraction.py
+
+"""
+Module for extracting one large finding aid across several processes.
+
+This module splits the <dsc> of an EAD into its top-level series using the byte-offset series index, and has a pool
+of worker processes build the folder rows of each series from just that series' bytes. The rows are merged back
+in document order, so numbering and finalizing afterwards give exactly what a single-process run gives. Sharding is
+off unless asked for, with the LABELGENE_EXTRACTION_WORKERS environment variable or batch.py's --shard-workers.
+"""
+
+import contextlib
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from data_processing import iter_terminal_components, process_terminal_components, FolderRows, concat_folder_frames
+from data_extraction import tag_kind, C_COMPONENT
+from series_index import load_series_index, parse_series_span
+
+SHARDING_THRESHOLD_BYTES = 5 * 1024 * 1024  # smaller EADs are extracted faster than worker processes start up
+EXTRACTION_WORKERS_ENV = "LABELGENE_EXTRACTION_WORKERS"  # processes for extracting one large EAD (unset: 1, no sharding)
+
+def default_extraction_workers():
+    '''Processes to extract one large EAD with, from LABELGENE_EXTRACTION_WORKERS; 1 (a single process) if unset or invalid.'''
+    value = os.environ.get(EXTRACTION_WORKERS_ENV)
+    if not value:
+        return 1
+    try:
+        return max(1, int(value))
+    except ValueError:
+        logging.error(f"Ignoring {EXTRACTION_WORKERS_ENV}={value!r}, not a number of processes")
+        return 1
+
+def extract_series_rows(file_path, series_index, span, columns, namespaces, collection_name, call_number):
+    """Worker: builds the folder rows of one indexed series. Returns (folder_df, counts, printed messages),
+    or None if the series' bytes could not be parsed."""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):  # messages are printed by the parent, in document order
+        dsc_element = parse_series_span(file_path, series_index, span)
+        # a span must hold exactly one component, or its rows would not be the ones a single-process run builds
+        if dsc_element is None or sum(tag_kind(child.tag) == C_COMPONENT for child in dsc_element) != 1:
+            return None
+        folder_rows = FolderRows(columns)
+        label_cache = {}
+        counts = process_terminal_components(iter_terminal_components(dsc_element, namespaces, label_cache), folder_rows,
+                                             namespaces, label_cache, collection_name, call_number)
+    return folder_rows.to_dataframe(), counts, output.getvalue()
+
+def extract_rows_sharded(file_path, folder_df, namespaces, collection_name, call_number, max_workers=None, catalog_directory=None):
+    """Extracts the folder rows of file_path series by series in up to max_workers processes (default: one per CPU core)
+    and appends them to folder_df in document order. Returns (folder_df, (explicit count, implicit count)), or None when
+    the file cannot be split (including when its series index does not match a real parse, see load_series_index) or a
+    series fails, in which case the caller extracts the whole document instead. The series index is kept in the catalog
+    of catalog_directory (default: the file's directory)."""
+    max_workers = max_workers or os.cpu_count() or 1
+    series_index = load_series_index(catalog_directory or os.path.dirname(os.path.abspath(file_path)), file_path, namespaces)
+    if series_index is None or len(series_index["spans"]) < 2:
+        return None
+    spans = series_index["spans"]
+
+    try:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(spans))) as executor:
+            # biggest series first so one large series does not start last, results are still read in document order
+            futures = {}
+            for position in sorted(range(len(spans)), key=lambda position: spans[position]["start"] - spans[position]["end"]):
+                futures[position] = executor.submit(extract_series_rows, file_path, series_index, spans[position],
+                                                    list(folder_df.columns), namespaces, collection_name, call_number)
+            results = [futures[position].result() for position in range(len(spans))]
+    except Exception as e:
+        logging.error(f"Sharded extraction of {file_path} failed, extracting it in one process: {str(e)}")
+        return None
+
+    if any(result is None for result in results):
+        logging.error(f"A series of {file_path} could not be parsed on its own as one component, extracting it in one process")
+        return None
+
+    explicit_count = implicit_count = 0
+    for _, (explicit, implicit), messages in results:
+        print(messages, end="")
+        explicit_count += explicit
+        implicit_count += implicit
+    logging.info(f"Extracted {len(spans)} series of {file_path} in {min(max_workers, len(spans))} processes")
+
+    # empty frames (e.g. the initial folder_df) are left out, as pandas warns about concatenating them
+    folder_df = concat_folder_frames([folder_df] + [series_df for series_df, _, _ in results])
+    return folder_df, (explicit_count, implicit_count)
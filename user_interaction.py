@@ -109,4 +109,38 @@ def parse_user_input(input_str, options_list):
     except ValueError as e:
         logging.error(f"Error parsing user input: {str(e)}")
         print(f"Error: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+def prompt_selection_scope():
+    ''' Ask whether to label the whole collection or only some series/boxes; returns None (whole collection), "series" or "box". '''
+    while True:
+        scope = input("\nWhat would you like to label?\n"
+                      "\n1. The whole collection "
+                      "\n2. Selected series only (picked before any folder is built) "
+                      "\n3. Selected boxes only (picked before any folder is built)\n\n")
+        logging.info(f"User selects labeling scope: {scope}")
+        if scope in ["", "1"]:
+            return None
+        elif scope == "2":
+            return "series"
+        elif scope == "3":
+            return "box"
+        print("Invalid input. Please enter '1', '2', or '3'.")
+
+def select_options(options_list, title):
+    ''' Display options (series or box) and ask until a valid selection is made; returns the selected values, or None if the user quits. '''
+    display_options(options_list, title)
+    while True:
+        user_input = input(f"Select {title} by individual numbers, range, or a combination (e.g., '1', '2-3', '4, 5-6') or type 'q' to quit: \n\n")
+        logging.info(f"user selects {title}: {user_input}")
+        if user_input.lower() == 'q':
+            print(f"\nExiting {title} selection...")
+            return None
+
+        selected_options = parse_user_input(user_input, options_list)
+        if selected_options:
+            print(f"\nYou selected: \n")
+            for option in selected_options:
+                print(option)
+            return selected_options
+        print(f"\nNo valid {title} options were selected or invalid input.")
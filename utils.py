@@ -9,12 +9,15 @@ to support the main processes of the script.
 """
 
 import os
+import json
 import shutil
 from datetime import datetime, timedelta
 import logging
 import re
 import pandas as pd
 
+from ead_catalog import file_content_hash
+
 
 def box_sort_order(box):
         # because there might be alphanumeric box number for e.g. '10A'
@@ -26,22 +29,57 @@ def box_sort_order(box):
         else:
             return (0, box)
         
-def custom_sort_key(option):
-    ''' Custom sorting function for box selection display to sort by number first, then text. '''
-    matches = re.match(r'(\d+)(.*)', option)
-    if matches:
-        number_part = int(matches.group(1))
-        text_part = matches.group(2)
-        return (number_part, text_part)
-    return (0, option)  # Default for items without a leading number
-
-def move_recent_ead_files(working_directory):
-    '''this copies recently downloaded EAD files from ASpace so that user skips the step of having to go to Downloads folder'''
-    downloads_folder = os.path.join("C:\\", "Users", os.getlogin(), "Downloads")
+def box_sort_keys(boxes):
+    ''' box_sort_order for a whole column, from one str.extract: a DataFrame of key columns where boxes without a
+    number come first, ordered by their text, and the others follow ordered by their first number. '''
+    numbers = boxes.str.extract(r'(\d+)', expand=False)
+    has_number = numbers.notna()
+    return pd.DataFrame({'has_number': has_number.astype(int),
+                         'number': pd.to_numeric(numbers).fillna(0).astype(int),
+                         'text': boxes.where(~has_number, '')})
+
+def folder_sort_keys(boxes, folder_numbers):
+    ''' The keys finalize_dataframes orders folder rows by: box_sort_keys, then the folder number (0 for none). '''
+    sort_keys = box_sort_keys(boxes)
+    sort_keys['folder'] = folder_numbers
+    return sort_keys
+
+def custom_sort_keys(options):
+    ''' Sort keys for the box selection display (number first, then text), for a whole column from one str.extract:
+    the leading number (0 if none) and the rest. '''
+    parts = options.str.extract(r'^(\d+)(.*)')
+    has_number = parts[0].notna()
+    return pd.DataFrame({'number': pd.to_numeric(parts[0]).fillna(0).astype(int),
+                         'text': parts[1].where(has_number, options)})
+
+def sort_permutation(sort_keys):
+    ''' Row positions that order a table by its key columns (left to right), ties kept in table order. '''
+    if sort_keys.empty:
+        return []
+    return sort_keys.reset_index(drop=True).sort_values(by=list(sort_keys.columns), kind='stable').index.tolist()
+
+IMPORT_MANIFEST_FILENAME = ".ead_import_manifest.json"
+DOWNLOADS_FOLDER_ENV = "LABELGENE_DOWNLOADS"  # overrides where recent EAD downloads are picked up from
+
+def default_downloads_folder():
+    return os.environ.get(DOWNLOADS_FOLDER_ENV) or os.path.join(os.path.expanduser("~"), "Downloads")
+
+def move_recent_ead_files(working_directory, downloads_folder=None):
+    '''this copies recently downloaded EAD files from ASpace so that user skips the step of having to go to Downloads folder
+    A manifest in the working directory records size, mtime and hash of everything imported, so unchanged downloads are skipped;
+    files are hardlinked into the working directory where the filesystem allows it, and copied otherwise'''
+    downloads_folder = downloads_folder or default_downloads_folder()
+    manifest_path = os.path.join(working_directory, IMPORT_MANIFEST_FILENAME)
     file_extension = ".xml"
     one_day_ago = datetime.now() - timedelta(days=1)
 
     try:
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+        except (FileNotFoundError, ValueError):
+            manifest = {}
+
         # First, filter out only recent files
         recent_files = [f for f in os.listdir(downloads_folder) if f.endswith(file_extension) and
                         datetime.fromtimestamp(os.path.getmtime(os.path.join(downloads_folder, f))) > one_day_ago]
@@ -49,19 +87,60 @@ def move_recent_ead_files(working_directory):
         # Log the count of recent files
         logging.info(f"Total recent XML files in Downloads folder: {len(recent_files)}")
 
-        # Process only the recent files
+        # Process only the recent files that are new or changed since they were last imported
+        imported_count = 0
         for filename in recent_files:
             filepath = os.path.join(downloads_folder, filename)
             destination = os.path.join(working_directory, filename)
-            shutil.copy(filepath, destination)
+            stat = os.stat(filepath)
+            record = manifest.get(filename)
+
+            if record is not None and os.path.exists(destination):
+                if record["size"] == stat.st_size and record["mtime"] == stat.st_mtime:
+                    continue
+                content_hash = file_content_hash(filepath)
+                if record["sha256"] == content_hash:  # touched but identical
+                    record.update(size=stat.st_size, mtime=stat.st_mtime)
+                    continue
+            else:
+                content_hash = file_content_hash(filepath)
+
+            if os.path.exists(destination) and os.path.samefile(filepath, destination):
+                # the downloads folder is the working directory (or the file is already linked in): nothing to import
+                manifest[filename] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": content_hash}
+                continue
+
+            # link or copy under a temporary name first, so the current copy is only replaced once the new one exists
+            temporary_destination = destination + ".importing"
+            try:
+                try:
+                    os.link(filepath, temporary_destination)
+                except OSError:  # e.g. different drive, or a filesystem without hardlinks
+                    shutil.copy2(filepath, temporary_destination)
+                os.replace(temporary_destination, destination)
+            finally:
+                if os.path.exists(temporary_destination):
+                    os.remove(temporary_destination)
+            manifest[filename] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": content_hash}
+            imported_count += 1
             logging.info(f"Copied {filename} to {working_directory}")
 
+        logging.info(f"Imported {imported_count} new or changed EAD file(s); {len(recent_files) - imported_count} already up to date")
+
+        with open(manifest_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, indent=1)
+
     except Exception as e:
         logging.error(f"Error copying files to current directory: {str(e)}")
               
-def prepend_or_fill(column_name, x, idx):
+def prepend_or_fill_column(column_name, values, fill_numbers):
+    ''' Labels a whole column at once: each value gets the "Box "/"Folder " prefix, and empty cells
+    are filled with the matching entry of fill_numbers (e.g. the row's position + 1 for continuous numbering). '''
     prefix = "Box " if column_name == 'BOX' else "Folder "
-    if pd.notnull(x):  # If the cell has a value, it must be INTEGER. If Box, 
-        return prefix + str(x)
-    else:  # If the cell is empty
-        return prefix + str(idx + 1)
\ No newline at end of file
+    filled = values.astype(object).where(values.notna(), pd.Series(fill_numbers, index=values.index, dtype=object))
+    return prefix + filled.astype(str)
+
+def count_within_runs(values):
+    ''' 1-based position of each value within its run of consecutive equal values, e.g. a, a, b, a -> 1, 2, 1, 1. '''
+    run_ids = (values != values.shift()).cumsum()
+    return values.groupby(run_ids, sort=False).cumcount() + 1
@@ -8,75 +8,229 @@ and extracting relevant metadata from the parsed XML files. It provides function
 handling character encoding issues, parsing XML, and extracting collection-level information.
 """
 
+import contextlib
 import glob
+import io
 import os
+import re
 from lxml import etree as ET
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from utils import move_recent_ead_files
-from data_processing import is_terminal_node  
+from ead_catalog import read_catalog, update_catalog, file_content_hash
 from user_interaction import user_select_collection
+from data_extraction import tag_kind, C_COMPONENT
 
 def is_ead_file(file_path):
     with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
         first_lines = ''.join(file.readline() for _ in range(10))
         return '<ead>' in first_lines or '<ead ' in first_lines  # Simple check for EAD root element
 
-def preprocess_ead_file(file_path):
-    sanitized_file_path = file_path.replace(".xml", "_sanitized.xml")
-    if not try_parse(file_path):
-        print(f"\nSanitizing EAD file due to character encoding issues: {file_path}\n")
-        sanitize_xml(file_path, sanitized_file_path)
-        if try_parse(sanitized_file_path):
-            return sanitized_file_path
-        else:
-            print(f"Failed to parse EAD file even after sanitizing: {file_path}")
-            return None
-    else:
-        return file_path
-    
+class EADDocument:
+    """Parsed-document session for one EAD: owns the lxml tree so discovery, header extraction and
+    component traversal all share a single parse of the file. The tree is only built when first needed.
+    An EAD with invalid characters is sanitized into a _sanitized.xml artifact, which is parsed from then on (also by
+    later runs, for as long as it is newer than the EAD); it is only sanitized into memory if the artifact cannot be written.
+    The artifact is kept next to the EAD unless artifact_directory is given (e.g. batch.py's --output directory)."""
+
+    def __init__(self, path, artifact_directory=None):
+        self.path = path
+        self.artifact_directory = artifact_directory
+        self.sanitized_path = fresh_sanitized_artifact(path, artifact_directory)  # sanitized copy from an earlier run, if still current
+        self.sanitized_data = None  # sanitized bytes, if the file itself was not well-formed and no artifact could be saved
+        self.replaced_characters = {}  # sanitize_xml_stream report: line number -> replaced characters
+        self._tree = None
+        self._well_formed = None
+        self._invalid_bytes = None  # has_invalid_xml_bytes of the EAD, once file_source() has checked it
+        self.ancestor_labels = {}  # per-document cache of formatted C0N_ANCESTOR labels, keyed by component element
+
+    @property
+    def tree(self):
+        """The parsed tree, or None if the EAD could not be parsed even after sanitizing."""
+        if self._tree is None and self._well_formed is not False:
+            self._tree = try_parse(self.source())
+            if self._tree is None and self._sanitize():
+                self._tree = try_parse(self.source())
+            self._well_formed = self._tree is not None
+            if not self._well_formed:
+                print(f"Failed to parse EAD file even after sanitizing: {self.path}")
+        return self._tree
+
+    @property
+    def root(self):
+        return self.tree.getroot() if self.tree is not None else None
+
+    def find(self, path, namespaces):
+        root = self.root
+        return root.find(path, namespaces=namespaces) if root is not None else None
+
+    def source(self):
+        """What to hand to a parser: the file path, the sanitized artifact, or a buffer over the sanitized bytes."""
+        if self.sanitized_data is not None:
+            return io.BytesIO(self.sanitized_data)
+        return self.sanitized_path or self.path
+
+    def prepare(self):
+        """Makes sure source() is well-formed (sanitizing if needed) without building a tree, for streaming.
+        This is a parse of its own on purpose: a file found to be malformed half-way through streaming would already
+        have some of its folder rows built, and the check builds no tree, so memory stays flat."""
+        if self._well_formed is None:
+            self._well_formed = is_well_formed(self.source()) or (self._sanitize() and is_well_formed(self.source()))
+            if not self._well_formed:
+                print(f"Failed to parse EAD file even after sanitizing: {self.path}")
+        return self._well_formed
+
+    def _sanitize(self):
+        if self.sanitized_data is not None or self.sanitized_path is not None:  # already parsing sanitized data
+            return False
+        print(f"\nSanitizing EAD file due to character encoding issues: {self.path}\n")
+        artifact_path = sanitized_artifact_path(self.path, self.artifact_directory)
+        try:
+            # sanitized straight into the artifact, which is parsed (and streamed) from then on
+            with open(self.path, 'rb') as infile, open(artifact_path, 'wb') as outfile:
+                self.replaced_characters = sanitize_xml_stream(infile, outfile)
+            self.sanitized_path = artifact_path
+        except OSError as e:
+            logging.error(f"Could not save sanitized copy {artifact_path}, sanitizing in memory: {str(e)}")
+            with contextlib.suppress(OSError):
+                os.remove(artifact_path)  # a partly written copy would otherwise be taken for a fresh one
+            output = io.BytesIO()
+            with open(self.path, 'rb') as infile:
+                self.replaced_characters = sanitize_xml_stream(infile, output)
+            self.sanitized_data = output.getvalue()
+        logging.info(f"Sanitized {self.path}: replaced {sum(len(chars) for chars in self.replaced_characters.values())} "
+                     f"characters on {len(self.replaced_characters)} lines")
+        return True
+
+    def file_source(self):
+        """A file whose bytes parse like source(), for readers that need a path rather than a buffer (e.g. splitting
+        the EAD into series): the EAD itself, or its sanitized artifact. An EAD with characters not allowed in XML is
+        sanitized here, once, as a full parse would do. None if the sanitized copy could not be saved."""
+        if self.sanitized_path is None and self.sanitized_data is None:
+            if self._invalid_bytes is None:
+                self._invalid_bytes = has_invalid_xml_bytes(self.path)
+            if self._invalid_bytes:
+                self._sanitize()
+        if self.sanitized_data is not None:
+            return fresh_sanitized_artifact(self.path, self.artifact_directory)
+        return self.sanitized_path or self.path
+
+    def release(self):
+        """Drops the parsed tree (e.g. for collections the user did not pick); it is re-parsed on next access."""
+        self._tree = None
+        self.ancestor_labels = {}
+
+# Sanitized artifacts: <name>_sanitized.xml next to <name>.xml, replaced once their source EAD changes
+SANITIZED_SUFFIX = "_sanitized.xml"
+
+def sanitized_artifact_source(artifact_path):
+    return artifact_path[:-len(SANITIZED_SUFFIX)] + ".xml"
+
+def is_sanitized_artifact(file_path):
+    """True for a sanitized copy of an EAD that is still there; a copy whose source was removed is treated as an EAD
+    of its own (it may be the only usable version of that finding aid)."""
+    return file_path.endswith(SANITIZED_SUFFIX) and os.path.exists(sanitized_artifact_source(file_path))
+
+def sanitized_artifact_path(file_path, artifact_directory=None):
+    artifact_path = file_path[:-len(".xml")] + SANITIZED_SUFFIX
+    if artifact_directory is not None:
+        artifact_path = os.path.join(artifact_directory, os.path.basename(artifact_path))
+    return artifact_path
+
+def fresh_sanitized_artifact(file_path, artifact_directory=None):
+    """Returns the sanitized artifact for file_path if it exists and is not older than the EAD, else None."""
+    artifact_path = sanitized_artifact_path(file_path, artifact_directory)
+    try:
+        if os.path.getmtime(artifact_path) >= os.path.getmtime(file_path):
+            return artifact_path
+    except OSError:
+        pass
+    return None
+
+def collect_stale_sanitized_artifacts(working_directory):
+    """Deletes sanitized artifacts whose source EAD has been modified since they were written. Copies whose source
+    is gone are left alone."""
+    for artifact_path in glob.glob(os.path.join(working_directory, '*' + SANITIZED_SUFFIX)):
+        source_path = sanitized_artifact_source(artifact_path)
+        if os.path.exists(source_path) and fresh_sanitized_artifact(source_path) is None:
+            try:
+                os.remove(artifact_path)
+                logging.info(f"Removed stale sanitized copy {artifact_path}")
+            except OSError as e:
+                logging.error(f"Could not remove stale sanitized copy {artifact_path}: {str(e)}")
+
 def try_parse(input_file):
-    """Attempt to parse EAD(.xml) and return boolean result."""
+    """Attempt to parse EAD(.xml) and return the parsed tree, or None if it is not well-formed."""
     try:
-        ET.parse(input_file)
+        return ET.parse(input_file)
+    except ET.XMLSyntaxError:
+        return None
+
+class _DiscardingTarget:
+    """Parser target with no callbacks: lxml then only checks well-formedness and builds nothing."""
+    def close(self):
+        return None
+
+def is_well_formed(input_file):
+    """Well-formedness check that never holds a tree in memory (used ahead of streaming extraction)."""
+    try:
+        ET.parse(input_file, ET.XMLParser(target=_DiscardingTarget()))
         return True
     except ET.XMLSyntaxError:
         return False
     
-def sanitize_xml(input_file_path, output_file_path):
-    """Sanitize EAD by replacing characters that are not allowed in .xml"""
-
-    def is_valid_xml_char(ch):
-        codepoint = ord(ch)
-        return (
-            codepoint == 0x9 or 
-            codepoint == 0xA or 
-            codepoint == 0xD or 
-            (0x20 <= codepoint <= 0xD7FF) or 
-            (0xE000 <= codepoint <= 0xFFFD) or 
-            (0x10000 <= codepoint <= 0x10FFFF)
-        )
+# Code points not allowed in XML 1.0, as they appear in UTF-8: C0 controls other than tab/LF/CR, and U+FFFE/U+FFFF
+# (surrogates cannot occur in valid UTF-8, and control bytes never occur inside a multi-byte sequence)
+INVALID_XML_BYTES = re.compile(rb'[\x00-\x08\x0b\x0c\x0e-\x1f]|\xef\xbf[\xbe\xbf]')
+SANITIZE_CHUNK_SIZE = 1024 * 1024
+
+def has_invalid_xml_bytes(file_path):
+    """True if the file contains any of INVALID_XML_BYTES (read in chunks, without parsing)."""
+    with open(file_path, 'rb') as infile:
+        tail = b''
+        while True:
+            data = infile.read(SANITIZE_CHUNK_SIZE)
+            if not data:
+                return False
+            if INVALID_XML_BYTES.search(tail + data):
+                return True
+            tail = data[-2:]  # a U+FFFE/U+FFFF sequence may be split across chunks
+
+def sanitize_xml_stream(infile, outfile):
+    """Copies binary infile to outfile, replacing characters not allowed in .xml with '?'; returns {line: [chars]}.
+    Works on fixed-size byte chunks with one compiled pattern, so clean stretches are copied straight through."""
 
     replaced_data = {}
+    line_num = 1
+    pending = b''  # tail of the previous chunk that may be the start of a split U+FFFE/U+FFFF sequence
+
+    while True:
+        data = infile.read(SANITIZE_CHUNK_SIZE)
+        chunk = pending + data
+        pending = b''
+        if data:
+            if chunk.endswith(b'\xef\xbf'):
+                chunk, pending = chunk[:-2], chunk[-2:]
+            elif chunk.endswith(b'\xef'):
+                chunk, pending = chunk[:-1], chunk[-1:]
+
+        position = 0
+        found_invalid = False
+        for match in INVALID_XML_BYTES.finditer(chunk):
+            found_invalid = True
+            line_num += chunk.count(b'\n', position, match.start())
+            position = match.start()
+            replaced_data.setdefault(line_num, []).append(match.group().decode('utf-8'))
+        line_num += chunk.count(b'\n', position)
 
-    with open(input_file_path, 'r', encoding='utf-8') as infile, open(output_file_path, 'w', encoding='utf-8') as outfile:
-        for line_num, line in enumerate(infile, start=1):  # enumerate will provide a counter starting from 1
-            replaced_chars = []
-            sanitized_line_list = []
-            
-            for ch in line:
-                if is_valid_xml_char(ch):
-                    sanitized_line_list.append(ch)
-                else:
-                    sanitized_line_list.append('?')
-                    replaced_chars.append(ch)
-            
-            # If we found invalid chars in this line, store them in the dictionary
-            if replaced_chars:
-                replaced_data[line_num] = replaced_chars
-                print(f"Found invalid characters on line {line_num}: {' '.join(replaced_chars)}")
-
-            outfile.write(''.join(sanitized_line_list))
+        outfile.write(INVALID_XML_BYTES.sub(b'?', chunk) if found_invalid else chunk)
+
+        if not data:
+            break
+
+    for line, replaced_chars in replaced_data.items():
+        print(f"Found invalid characters on line {line}: {' '.join(replaced_chars)}")
 
     if not replaced_data:
         print("No invalid characters found!")
@@ -87,123 +241,173 @@ def sanitize_xml(input_file_path, output_file_path):
         
     return replaced_data
 
-def process_ead_files(working_directory, namespaces):
+def iterparse_terminal_components(source, namespaces, label_cache=None):
+    """Streams the <dsc> of an EAD with iterparse, yielding (component, did_element, None) for each terminal <c>/<cxx>
+    as soon as it closes, in the shape of data_processing.iter_terminal_components (ancestor data is left to the caller).
+    Ancestor components are still open (so their <did> titles can be read), while every component is
+    detached from the tree once it has closed, so memory follows nesting depth rather than file size.
+    source is a path or a binary file object; a path is opened here and closed once the generator finishes or is closed."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as file:
+            yield from iterparse_terminal_components(file, namespaces, label_cache)
+        return
+
+    dsc_tag = ET.QName(namespaces['ns'], 'dsc').text
+    in_dsc = False
+    open_elements = []  # [element, has_c_child] for every open element below <dsc>
+
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if not in_dsc:
+            in_dsc = event == 'start' and elem.tag == dsc_tag
+            continue
+
+        if event == 'start':
+            if tag_kind(elem.tag) == C_COMPONENT and open_elements:
+                open_elements[-1][1] = True  # parent now known to be a non-terminal node
+            open_elements.append([elem, False])
+            continue
+
+        if not open_elements:  # closing </dsc>: nothing left to extract
+            break
+
+        _, has_c_child = open_elements.pop()
+        if tag_kind(elem.tag) == C_COMPONENT:
+            if not has_c_child:
+                yield elem, elem.find('.//ns:did', namespaces=namespaces), None
+            # finished component (and its whole subtree) is no longer needed, nor is its cached ancestor label
+            if label_cache is not None:
+                label_cache.pop(elem, None)
+            elem.clear()
+            elem.getparent().remove(elem)
+
+# Collection-level fields shown in the picker and printed on labels: key -> (path from the <ead> root, fallback)
+HEADER_FIELDS = {
+    "name": ('./ns:archdesc/ns:did/ns:unittitle', "Unknown Collection"),
+    "number": ('./ns:archdesc/ns:did/ns:unitid', "Unknown Call Number"),
+    "repository": ('./ns:archdesc/ns:did/ns:repository/ns:corpname', "Unknown Repository"),
+    "author": ('./ns:eadheader/ns:filesdesc/ns:titlestmt/ns:author', "by Unknown Author"),
+}
+
+def extract_collection_header(document, namespaces):
+    """Reads the HEADER_FIELDS from a parsed EAD."""
+    header = {}
+    for key, (path, fallback) in HEADER_FIELDS.items():
+        element = document.find(path, namespaces)
+        header[key] = element.text if element is not None else fallback
+    return header
+
+def scan_ead_header(file_path, namespaces):
+    """Reads the HEADER_FIELDS with iterparse and stops as soon as <dsc> opens, so the component
+    list (the bulk of any finding aid) is never read. Raises XMLSyntaxError if the header is malformed."""
+    wanted = {tuple(ET.QName(namespaces[step.split(':')[0]], step.split(':')[1]).text for step in path.split('/')[1:]): key
+              for key, (path, _) in HEADER_FIELDS.items()}
+    dsc_tag = ET.QName(namespaces['ns'], 'dsc').text
+    found = {}
+    open_tags = []
+
+    with open(file_path, 'rb') as file:
+        for event, elem in ET.iterparse(file, events=('start', 'end')):
+            if event == 'start':
+                if elem.tag == dsc_tag:
+                    break
+                open_tags.append(elem.tag)
+                continue
+
+            key = wanted.get(tuple(open_tags[1:]))  # path below the <ead> root
+            if key is not None and key not in found:
+                found[key] = elem.text
+            open_tags.pop()
+            if len(found) == len(wanted):
+                break
+
+    return {key: found[key] if key in found else fallback for key, (_, fallback) in HEADER_FIELDS.items()}
+
+DISCOVERY_WORKERS = min(8, os.cpu_count() or 1)  # threads used to scan new or changed XML files
+
+def describe_xml_file(file_path, namespaces, artifact_directory=None):
+    """Sniffs one XML file and, if it is an EAD, reads its header: returns (catalog entry, EADDocument or None).
+    The document is only parsed already if the header scan had to fall back to a full parse."""
+    entry = {"is_ead": is_ead_file(file_path), "content_hash": file_content_hash(file_path)}
+    document = None
+    if entry["is_ead"]:
+        document = EADDocument(file_path, artifact_directory)
+        try:
+            entry.update(scan_ead_header(file_path, namespaces))
+        except ET.XMLSyntaxError:
+            # bad characters before <dsc>: fall back to a full (sanitizing) parse
+            if document.tree is not None:
+                entry.update(extract_collection_header(document, namespaces))
+            else:
+                entry["is_ead"] = False  # not usable as an EAD, so keep it out of the picker
+                document = None
+    return entry, document
+
+def process_ead_files(working_directory, namespaces, max_workers=DISCOVERY_WORKERS):
     try:
         move_recent_ead_files(working_directory)
+        collect_stale_sanitized_artifacts(working_directory)
         
-        # Fetch all XML files in the working directory
-        xml_files = glob.glob(os.path.join(working_directory, '*.xml'))
+        # Fetch all XML files in the working directory (sanitized copies of EADs that are still there are not collections)
+        all_xml_files = glob.glob(os.path.join(working_directory, '*.xml'))
+        xml_files = [file for file in all_xml_files if not is_sanitized_artifact(file)]
         logging.info(f"Total XML files found in working directory: {len(xml_files)}")
 
         # Sort files by modification time, with most recent first
-        xml_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-
-        # Filter for EAD files
-        ead_files = [file for file in xml_files if is_ead_file(file)]
-        logging.info(f"Total EAD files after filtering: {len(ead_files)}")
-
-        if len(ead_files) == 0:
-            logging.info("No EAD files found after filtering.")
-            print("No EAD files found in the directory.\n")
-            print("Please make sure to bring over the EAD finding aid file into this directory.\n")
-            print("Until then...thank you, and goodbye!\n")
-            return None
+        file_stats = {file: os.stat(file) for file in xml_files}
+        xml_files.sort(key=lambda x: file_stats[x].st_mtime, reverse=True)
 
         collections = []
-        
+
         # this part extracts the generic data from EAD that'll go on label/printed to console
-        for file_path in ead_files:
-            processed_file = preprocess_ead_file(file_path)
-            if processed_file is not None:
-                try:
-                    tree = ET.parse(processed_file)
-                    root = tree.getroot()
-                    
-                    repository_element = root.find('./ns:archdesc/ns:did/ns:repository/ns:corpname', namespaces=namespaces)
-                    collection_name_element = root.find('./ns:archdesc/ns:did/ns:unittitle', namespaces=namespaces)
-                    call_num_element = root.find('./ns:archdesc/ns:did/ns:unitid', namespaces=namespaces)
-                    finding_aid_author_element = root.find('./ns:eadheader/ns:filesdesc/ns:titlestmt/ns:author', namespaces=namespaces)
-                    
-                    repository_name = repository_element.text if repository_element is not None else "Unknown Repository"
-                    collection_name = collection_name_element.text if collection_name_element is not None else "Unknown Collection"
-                    call_number = call_num_element.text if call_num_element is not None else "Unknown Call Number"
-                    finding_aid_author = finding_aid_author_element.text if finding_aid_author_element is not None else "by Unknown Author"
-
-                    collections.append({"path": processed_file, "name": collection_name, "number": call_number, "repository": repository_name, "author": finding_aid_author})
+        # the catalog remembers each file's EAD verdict and header, so only new or changed files are read;
+        # the EADDocument travels with the collection info and parses on first use; an unreadable catalog only means
+        # every file is rescanned
+        cached_entries = read_catalog(working_directory, file_stats)
+        file_entries = {file_path: (entry, None) for file_path, entry in cached_entries.items()}
 
+        # new or changed files are sniffed, hashed and header-scanned concurrently (lxml releases the GIL while parsing)
+        files_to_scan = [file for file in xml_files if file not in file_entries]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {file_path: executor.submit(describe_xml_file, file_path, namespaces) for file_path in files_to_scan}
+            for file_path, future in futures.items():
+                try:
+                    file_entries[file_path] = future.result()
                 except Exception as e:
                     logging.error(f"Error processing file {file_path}: {str(e)}")
                     print(f"Encountered an error with file {file_path}, but continuing with processing.\n")
 
-        if len(collections) == 1:
-            return collections[0]
+        # collections keep the most-recent-first order of xml_files, whichever worker finished first
+        for file_path in xml_files:
+            if file_path in file_entries and file_entries[file_path][0]["is_ead"]:
+                entry, document = file_entries[file_path]
+                header = {key: entry[key] for key in HEADER_FIELDS}
+                collections.append({"path": file_path, **header, "content_hash": entry["content_hash"], "document": document or EADDocument(file_path)})
 
-        elif len(collections) > 1:
-            return user_select_collection(collections)
+        # sanitized artifacts are not collections, but the series index of a sanitized EAD is saved under its artifact
+        update_catalog(working_directory, file_stats,
+                       {file_path: file_entries[file_path][0] for file_path in files_to_scan if file_path in file_entries},
+                       existing_paths=all_xml_files)
+        logging.info(f"Rescanned {len(files_to_scan)} new or changed XML file(s) with {max_workers} worker(s); {len(xml_files) - len(files_to_scan)} read from the EAD catalog")
+        logging.info(f"Total EAD files after filtering: {len(collections)}")
 
-        else:
-            print("No suitable EAD files found for processing.\n")
+        if len(collections) == 0:
+            logging.info("No EAD files found after filtering.")
+            print("No EAD files found in the directory.\n")
+            print("Please make sure to bring over the EAD finding aid file into this directory.\n")
+            print("Until then...thank you, and goodbye!\n")
             return None
 
-    except Exception as e:
-        logging.error(f"Error in process_ead_files: {str(e)}")
-        return None
-    try:
-        move_recent_ead_files(working_directory)
-        
-        # Fetch all XML files in the working directory
-        xml_files = glob.glob(os.path.join(working_directory, '*.xml'))
-        logging.info(f"Total XML files found in working directory: {len(xml_files)}")
-
-        # Sort files by modification time, with most recent first
-        xml_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
+        if len(collections) == 1:
+            return collections[0]
 
-        # Filter for EAD files
-        ead_files = [file for file in xml_files if is_ead_file(file)]
-        logging.info(f"Total EAD files after filtering: {len(ead_files)}")
+        else:
+            selected_collection = user_select_collection(collections)
+            # only the chosen collection's tree is needed from here on
+            for collection in collections:
+                if collection is not selected_collection:
+                    collection["document"].release()
+            return selected_collection
 
     except Exception as e:
         logging.error(f"Error in process_ead_files: {str(e)}")
-    
-    if len(ead_files) == 0:
-        logging.info("No EAD files found after filtering.")
-        print("No EAD files found in the directory.\n")
-        print("Please make sure to bring over the EAD finding aid file into this directory.\n")
-        print("Until then...thank you, and goodbye!\n")
         return None
-
-    collections = []
-    
-    # this part extracts the generic data from EAD that'll go on label/printed to console
-    for file_path in ead_files:
-        processed_file = preprocess_ead_file(file_path)
-        if processed_file is not None:
-            try:
-                tree = ET.parse(processed_file)
-                root = tree.getroot()
-                
-                repository_element = root.find('./ns:archdesc/ns:did/ns:repository/ns:corpname', namespaces=namespaces)
-                collection_name_element = root.find('./ns:archdesc/ns:did/ns:unittitle', namespaces=namespaces)
-                call_num_element = root.find('./ns:archdesc/ns:did/ns:unitid', namespaces=namespaces)
-                finding_aid_author_element = root.find('./ns:eadheader/ns:filesdesc/ns:titlestmt/ns:author', namespaces=namespaces)
-                
-                repository_name = repository_element.text if repository_element is not None else "Unknown Repository"
-                collection_name = collection_name_element.text if collection_name_element is not None else "Unknown Collection"
-                call_number = call_num_element.text if call_num_element is not None else "Unknown Call Number"
-                finding_aid_author = finding_aid_author_element.text if finding_aid_author_element is not None else "by Unknown Author"
-
-                collections.append({"path": processed_file, "name": collection_name, "number": call_number, "repository": repository_name, "author": finding_aid_author})
-
-            except Exception as e:
-                logging.error(f"Error processing file {file_path}: {str(e)}")
-                print(f"Encountered an error with file {file_path}, but continuing with processing.\n")
-
-    if len(collections) == 1:
-        return collections[0]
-
-    elif len(collections) > 1:
-        return user_select_collection(collections)
-
-    else:
-        print("No suitable EAD files found for processing.\n")
-        return None
\ No newline at end of file